@@ -0,0 +1,74 @@
+"""Модуль классов аутентификации API-сервиса."""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.caches import cache_is_shared, get_versions, recipe_fragments
+from users.constants import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL
+
+
+def token_version_key(user_id):
+    return "auth:token:version:%s" % user_id
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшем пользователей в памяти процесса.
+
+    Запись действительна, пока не истек ее срок и не изменились версии
+    профиля пользователя и его токенов в общем кэше: их увеличивают
+    сигналы при сохранении пользователя и удалении токена. Без общего
+    кэша версий изменения из других процессов не видны, поэтому кэш
+    токенов тогда не используется.
+    """
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+
+    def authenticate_credentials(self, key):
+        if not cache_is_shared():
+            return super().authenticate_credentials(key)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            user, token, versions, expires_at = entry
+            user_id = user.pk
+            current = get_versions(self._get_version_keys(user_id))
+            if time.monotonic() < expires_at and current == versions:
+                with self._lock:
+                    self._entries.move_to_end(key)
+                return copy.copy(user), token
+        else:
+            user_id = (
+                Token.objects.filter(key=key)
+                .values_list("user_id", flat=True).first()
+            )
+            if user_id is None:
+                raise exceptions.AuthenticationFailed(_("Invalid token."))
+            current = get_versions(self._get_version_keys(user_id))
+
+        # Версии прочитаны до запроса в базу: если их увеличат позже,
+        # сохраненная запись просто окажется устаревшей.
+        user, token = super().authenticate_credentials(key)
+        if user.pk == user_id:
+            with self._lock:
+                self._entries[key] = (
+                    copy.copy(user), token, current,
+                    time.monotonic() + TOKEN_CACHE_TTL,
+                )
+                self._entries.move_to_end(key)
+                while len(self._entries) > TOKEN_CACHE_SIZE:
+                    self._entries.popitem(last=False)
+        return user, token
+
+    @staticmethod
+    def _get_version_keys(user_id):
+        return [
+            recipe_fragments.user_version_key(user_id),
+            token_version_key(user_id),
+        ]
@@ -0,0 +1,348 @@
+"""Модуль для кэшей API-сервиса."""
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, prefetch_related_objects
+
+from api.metrics import count_cache_lookups
+from recipes.constants import (
+    FEED_CELEBRITIES_TTL, FEED_FANOUT_LIMIT, INGREDIENT_INDEX_TTL,
+    RECIPE_FRAGMENT_TTL, TAG_INDEX_TTL,)
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import Follow
+
+
+logger = logging.getLogger(__name__)
+
+CELEBRITIES_KEY = "feed:celebrities"
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared():
+    """Видят ли процессы сервиса общий кэш версий.
+
+    В кэше памяти процесса каждый воркер хранит свои версии и не узнает
+    об их увеличении в соседних.
+    """
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def get_versions(keys):
+    """Возвращает номера версий данных из общего кэша.
+
+    Отсутствующая версия заводится по текущему времени в миллисекундах,
+    поэтому после вытеснения из кэша она не совпадет с прежней.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = int(time.time() * 1000)
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return versions
+
+
+def get_version(key):
+    """Возвращает номер версии данных из общего кэша."""
+    return get_versions([key])[key]
+
+
+def bump_version(key):
+    """Увеличивает номер версии данных в общем кэше."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, None)
+        return version
+
+
+def get_celebrity_ids():
+    """Авторы, рецепты которых не раскладываются по лентам подписчиков."""
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = list(
+            Follow.objects.order_by()
+            .values("following")
+            .annotate(followers=Count("pk"))
+            .filter(followers__gte=FEED_FANOUT_LIMIT)
+            .values_list("following", flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, ids, FEED_CELEBRITIES_TTL)
+    return ids
+
+
+class ProcessIndex:
+    """Данные в памяти процесса, сверяемые с версией в общем кэше."""
+
+    NAME = None
+    VERSION_KEY = None
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._expires_at = 0
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех процессах."""
+        self._expires_at = 0
+        bump_version(self.VERSION_KEY)
+
+    def _get_data(self):
+        version = get_version(self.VERSION_KEY)
+        if (
+            self._data is None
+            or self._version != version
+            or time.monotonic() >= self._expires_at
+        ):
+            with self._lock:
+                if (
+                    self._data is None
+                    or self._version != version
+                    or time.monotonic() >= self._expires_at
+                ):
+                    self._data = self._build()
+                    self._version = version
+                    self._expires_at = time.monotonic() + self.ttl
+                    count_cache_lookups(self.NAME, 0, 1)
+                    return self._data
+        count_cache_lookups(self.NAME, 1, 0)
+        return self._data
+
+    def _build(self):
+        raise NotImplementedError
+
+
+class TagIndex(ProcessIndex):
+    """Соответствие слагов тегов их id в памяти процесса."""
+
+    NAME = "tag_index"
+    VERSION_KEY = "tags:version"
+
+    def __init__(self, ttl=TAG_INDEX_TTL):
+        super().__init__(ttl)
+
+    def get_ids(self, slugs):
+        """Id известных тегов по слагам, неизвестные пропускаются."""
+        ids = self._get_data()
+        return [ids[slug] for slug in slugs if slug in ids]
+
+    def _build(self):
+        return dict(Tag.objects.values_list("slug", "id"))
+
+
+class IngredientIndex(ProcessIndex):
+    """Индекс ингредиентов в памяти процесса для автодополнения."""
+
+    NAME = "ingredient_index"
+    VERSION_KEY = "ingredient_index:version"
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        super().__init__(ttl)
+
+    def search(self, query):
+        """Ингредиенты по префиксу, затем по подстроке и популярности."""
+        keys, rows, usage, haystack, offsets, _ = self._get_data()
+        query = query.casefold()
+
+        position = bisect_left(keys, query)
+        end = position
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+
+        substring_hits = set()
+        found = haystack.find(query) if "\n" not in query else -1
+        while found != -1:
+            index = bisect_right(offsets, found) - 1
+            if found != offsets[index]:
+                substring_hits.add(index)
+            found = haystack.find(query, offsets[index + 1])
+        substring_hits = sorted(
+            substring_hits, key=lambda index: (-usage[index], keys[index]),
+        )
+        return rows[position:end] + [rows[index] for index in substring_hits]
+
+    def fingerprint(self):
+        """Отпечаток популярности ингредиентов в текущей сборке индекса.
+
+        Счетчики использования меняются без увеличения версии, поэтому
+        порядок выдачи зависит от того, когда процесс собрал индекс.
+        """
+        return self._get_data()[-1]
+
+    def _build(self):
+        ingredients = sorted(
+            Ingredient.objects.annotate(
+                usage=Count("recipe_ingredients"),
+            ).values("id", "name", "measurement_unit", "usage"),
+            key=lambda item: (item["name"].casefold(), item["id"]),
+        )
+        keys = [item["name"].casefold() for item in ingredients]
+        usage = [item.pop("usage") for item in ingredients]
+
+        offsets = []
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        offsets.append(position)
+
+        fingerprint = hashlib.blake2b(
+            ",".join(map(str, usage)).encode(), digest_size=6,
+        ).hexdigest()
+
+        logger.info("Ingredient index built: %d items", len(ingredients))
+        return (
+            keys, ingredients, usage, "\n".join(keys) + "\n", offsets,
+            fingerprint,
+        )
+
+
+class RecipeFragmentCache:
+    """Кэш не зависящих от пользователя частей представления рецепта.
+
+    Ключ фрагмента включает версии рецепта, его автора и справочников,
+    которые увеличиваются сигналами при изменении данных. Флаги текущего
+    пользователя берутся из аннотаций и подставляются при каждом ответе.
+    """
+
+    CATALOG_VERSION_KEY = "catalog:version"
+    # Меняется вместе с составом полей фрагмента, чтобы после выкладки
+    # не отдавать фрагменты прежнего вида.
+    FRAGMENT_FORMAT = 2
+    USER_FIELDS = ("is_favorited", "is_in_shopping_cart",)
+
+    def __init__(self, timeout=RECIPE_FRAGMENT_TTL):
+        self.timeout = timeout
+
+    @staticmethod
+    def recipe_version_key(recipe_id):
+        return "recipe:version:%s" % recipe_id
+
+    @staticmethod
+    def user_version_key(user_id):
+        return "user:version:%s" % user_id
+
+    @staticmethod
+    def relations_version_key(user_id):
+        return "user:relations:version:%s" % user_id
+
+    def bump_recipe(self, recipe_id):
+        bump_version(self.recipe_version_key(recipe_id))
+
+    def bump_user(self, user_id):
+        bump_version(self.user_version_key(user_id))
+
+    def bump_relations(self, user_id):
+        bump_version(self.relations_version_key(user_id))
+
+    def bump_catalog(self):
+        bump_version(self.CATALOG_VERSION_KEY)
+
+    def render(self, recipes, serializer_class, request):
+        """Представления рецептов из кэша с флагами пользователя."""
+        recipes = list(recipes)
+        fragment_keys = self._get_fragment_keys(recipes)
+        fragments = cache.get_many(fragment_keys.values())
+
+        misses = [
+            recipe for recipe in recipes
+            if fragment_keys[recipe.pk] not in fragments
+        ]
+        count_cache_lookups(
+            "recipe_fragment", len(recipes) - len(misses), len(misses),
+        )
+        if misses:
+            fragments.update(self._build(misses, serializer_class, [
+                fragment_keys[recipe.pk] for recipe in misses
+            ]))
+
+        return [
+            self._personalize(
+                fragments[fragment_keys[recipe.pk]], recipe, request,
+            )
+            for recipe in recipes
+        ]
+
+    def _get_fragment_keys(self, recipes):
+        version_keys = {self.CATALOG_VERSION_KEY}
+        for recipe in recipes:
+            version_keys.add(self.recipe_version_key(recipe.pk))
+            version_keys.add(self.user_version_key(recipe.author_id))
+        versions = get_versions(list(version_keys))
+
+        return {
+            recipe.pk: "recipe:fragment:%s:%s:%s:%s:%s" % (
+                self.FRAGMENT_FORMAT,
+                recipe.pk,
+                versions[self.recipe_version_key(recipe.pk)],
+                versions[self.user_version_key(recipe.author_id)],
+                versions[self.CATALOG_VERSION_KEY],
+            )
+            for recipe in recipes
+        }
+
+    def _build(self, recipes, serializer_class, keys):
+        prefetch_related_objects(recipes, *Recipe.objects.related_lookups())
+        data = serializer_class(recipes, many=True, context={}).data
+
+        fragments = {}
+        for key, fragment in zip(keys, data):
+            fragment = dict(fragment)
+            for field in self.USER_FIELDS:
+                fragment[field] = None
+            fragments[key] = fragment
+        cache.set_many(fragments, self.timeout)
+
+        logger.debug("Recipe fragments built: %d", len(fragments))
+        return fragments
+
+    def _personalize(self, fragment, recipe, request):
+        data = dict(fragment)
+        data["is_favorited"] = bool(recipe.is_favorited)
+        data["is_in_shopping_cart"] = bool(recipe.is_in_shopping_cart)
+        data["image"] = self._absolute_url(request, data["image"])
+        data["image_variants"] = self._absolute_variants(
+            request, data["image_variants"],
+        )
+        data["author"] = dict(
+            data["author"],
+            is_subscribed=bool(recipe.is_author_subscribed),
+            avatar=self._absolute_url(request, data["author"]["avatar"]),
+            avatar_variants=self._absolute_variants(
+                request, data["author"]["avatar_variants"],
+            ),
+        )
+        return data
+
+    @staticmethod
+    def _absolute_url(request, url):
+        return request.build_absolute_uri(url) if url else url
+
+    @classmethod
+    def _absolute_variants(cls, request, variants):
+        if not variants:
+            return variants
+        return {
+            size_name: {
+                image_format: cls._absolute_url(request, url)
+                for image_format, url in formats.items()
+            }
+            for size_name, formats in variants.items()
+        }
+
+
+ingredient_index = IngredientIndex()
+tag_index = TagIndex()
+recipe_fragments = RecipeFragmentCache()
@@ -0,0 +1,27 @@
+"""Проверки настроек API-сервиса."""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from api.caches import cache_is_shared
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Предупреждает о кэше версий в памяти процесса вне отладки.
+
+    Фрагменты рецептов и ETag сверяются с версиями в кэше, и при
+    нескольких воркерах с таким кэшем они отдают устаревшие данные.
+    """
+    if settings.DEBUG or cache_is_shared():
+        return []
+    return [
+        Warning(
+            "The default cache is local to each process.",
+            hint=(
+                "Set DJANGO_CACHE_BACKEND to a shared backend so that "
+                "recipe fragments and ETags are invalidated in every "
+                "worker."
+            ),
+            id="api.W001",
+        ),
+    ]
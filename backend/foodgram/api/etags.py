@@ -0,0 +1,63 @@
+"""Модуль слабых ETag для условных запросов.
+
+ETag собирается из номеров версий в общем кэше, которые увеличиваются
+сигналами при изменении данных, поэтому для его проверки не нужно
+строить ответ.
+"""
+from api.caches import (
+    IngredientIndex, TagIndex, get_version, get_versions, ingredient_index,
+    recipe_fragments,)
+from recipes.models import Recipe
+
+TAGS_VERSION_KEY = TagIndex.VERSION_KEY
+
+
+def tags_etag(request, *args, **kwargs):
+    """ETag справочника тегов."""
+    return 'W/"tags-%s"' % get_version(TAGS_VERSION_KEY)
+
+
+def ingredients_etag(request, *args, **kwargs):
+    """ETag справочника ингредиентов.
+
+    Поиск по названию ранжирует по популярности из индекса в памяти,
+    поэтому в ETag входит и отпечаток его сборки.
+    """
+    return 'W/"ingredients-%s-%s"' % (
+        get_version(IngredientIndex.VERSION_KEY),
+        ingredient_index.fingerprint(),
+    )
+
+
+def recipe_etag(request, pk=None, **kwargs):
+    """ETag рецепта с учетом флагов текущего пользователя."""
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    author_id = Recipe.objects.filter(pk=pk).values_list(
+        "author_id", flat=True,
+    ).first()
+    if author_id is None:
+        return None
+
+    keys = [
+        recipe_fragments.recipe_version_key(pk),
+        recipe_fragments.user_version_key(author_id),
+        recipe_fragments.CATALOG_VERSION_KEY,
+    ]
+    if request.user.is_authenticated:
+        keys.append(recipe_fragments.relations_version_key(request.user.pk))
+    versions = get_versions(keys)
+
+    return 'W/"recipe-%s-%s-%s"' % (
+        pk,
+        request.user.pk or 0,
+        "-".join(str(versions[key]) for key in keys),
+    )
+
+
+def user_etag(request, *args, **kwargs):
+    """ETag профиля текущего пользователя."""
+    version = get_version(recipe_fragments.user_version_key(request.user.pk))
+    return 'W/"user-%s-%s"' % (request.user.pk, version)
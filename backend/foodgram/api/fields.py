@@ -1,19 +1,166 @@
 import base64
+import binascii
 import uuid
+from io import BytesIO
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile, TemporaryUploadedFile,)
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from recipes.constants import (
+    BASE64_CHUNK_SIZE, MAX_IMAGE_PIXELS, MAX_IMAGE_SIZE,)
+
+
+def get_objects_by_pk(queryset, pks):
+    """Загружает объекты по списку id одним запросом.
+
+    Порядок и повторы id сохраняются, а все отсутствующие id попадают
+    в одну ошибку валидации.
+    """
+    objects = queryset.in_bulk(set(pks))
+    missing = sorted(set(pks) - objects.keys())
+    if missing:
+        raise serializers.ValidationError(
+            "Не найдены объекты с id: %s." % ", ".join(map(str, missing))
+        )
+    return [objects[pk] for pk in pks]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список связанных объектов, который проверяется одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool):
+                self.child_relation.fail(
+                    "incorrect_type", data_type=type(pk).__name__,
+                )
+            try:
+                pks.append(int(pk))
+            except (TypeError, ValueError):
+                self.child_relation.fail(
+                    "incorrect_type", data_type=type(pk).__name__,
+                )
+        return get_objects_by_pk(self.child_relation.get_queryset(), pks)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, у которого many=True грузит id пачкой."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
 
 
 class Base64ImageField(serializers.ImageField):
     """Превращаем картинку из запроса в картинку-файл."""
 
+    default_error_messages = {
+        "too_large": "Размер изображения не должен превышать {max_size} байт.",
+        "too_many_pixels": (
+            "Изображение не должно содержать больше {max_pixels} пикселей."
+        ),
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            file_format, image = data.split(";base64,")
-            file_extension = file_format.split("/")[1]
-            data = ContentFile(
-                base64.b64decode(image),
-                name=f"{uuid.uuid4()}.{file_extension}",
-            )
+            data = self._decode(data)
+        if hasattr(data, "size"):
+            self._check_limits(data)
         return super().to_internal_value(data)
+
+    def _decode(self, data):
+        """Декодирует data-URI по частям во временный файл."""
+        header, separator, _ = data[:64].partition(";base64,")
+        if not separator:
+            self.fail("invalid_image")
+        offset = len(header) + len(separator)
+        file_extension = header.split("/")[1]
+        content_type = header[len("data:"):]
+
+        # Переносы строк и пробелы внутри base64 допустимы и не входят
+        # в размер.
+        data = data.rstrip()
+        whitespace = sum(data.count(char, offset) for char in " \t\r\n")
+        padding = data.count("=", len(data) - 2)
+        size = (len(data) - offset - whitespace) * 3 // 4 - padding
+        if size > MAX_IMAGE_SIZE:
+            self.fail("too_large", max_size=MAX_IMAGE_SIZE)
+
+        name = f"{uuid.uuid4()}.{file_extension}"
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(name, content_type, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, size, None,
+            )
+        try:
+            rest = ""
+            for start in range(offset, len(data), BASE64_CHUNK_SIZE):
+                chunk = rest + "".join(
+                    data[start:start + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+            if rest:
+                file.write(base64.b64decode(rest, validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail("invalid_image")
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def _check_limits(self, file):
+        """Проверяет размер файла и число пикселей по заголовку."""
+        if file.size > MAX_IMAGE_SIZE:
+            self.fail("too_large", max_size=MAX_IMAGE_SIZE)
+        try:
+            width, height = Image.open(file).size
+        except Exception:
+            self.fail("invalid_image")
+        finally:
+            file.seek(0)
+        if width * height > MAX_IMAGE_PIXELS:
+            self.fail("too_many_pixels", max_pixels=MAX_IMAGE_PIXELS)
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        field_file = getattr(instance, self.image_field)
+        variants = getattr(instance, f"{self.image_field}_variants")
+        if not field_file or variants.get("source") != field_file.name:
+            return None
+
+        request = self.context.get("request")
+        representation = {}
+        for size_name, formats in variants["sizes"].items():
+            representation[size_name] = {}
+            for image_format, path in formats.items():
+                url = field_file.storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                representation[size_name][image_format] = url
+        return representation
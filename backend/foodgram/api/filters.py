@@ -1,10 +1,50 @@
 """Модуль для фильтров вьюсета API-сервиса."""
 import django_filters
+from django import forms
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity,)
+from django.db.models import Exists, F, OuterRef, Q
 from django_filters.rest_framework import CharFilter, FilterSet
 
+from api.caches import tag_index
+from recipes.constants import SEARCH_CONFIG
 from recipes.models import Ingredient, Recipe
 
 
+class MultipleValueField(forms.Field):
+    """Поле со списком значений из повторяющегося параметра запроса."""
+
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        if not value:
+            return []
+        return [str(item) for item in value]
+
+
+class TagsFilter(django_filters.Filter):
+    """Фильтр рецептов по слагам тегов.
+
+    Слаги сопоставляются с id по индексу тегов в памяти процесса, а
+    рецепты отбираются одним EXISTS по связующей таблице, поэтому
+    выборка не размножается и не требует DISTINCT.
+    """
+
+    field_class = MultipleValueField
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = tag_index.get_ids(value)
+        if not tag_ids:
+            return qs.none()
+        return qs.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef("pk"), tag_id__in=tag_ids,
+            )
+        ))
+
+
 class IngredientFilter(FilterSet):
     """Фильтр для ингредиентов."""
 
@@ -18,16 +58,14 @@ class IngredientFilter(FilterSet):
 class RecipeFilter(FilterSet):
     """Фильтр для рецептов."""
 
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name="tags__slug",
-        lookup_expr="icontains",
-    )
+    tags = TagsFilter()
     is_in_shopping_cart = django_filters.NumberFilter(
         method="get_is_in_shopping_cart",
     )
     is_favorited = django_filters.NumberFilter(
         method="get_is_in_favorite",
     )
+    search = CharFilter(method="get_search")
 
     class Meta:
 
@@ -37,16 +75,31 @@ class RecipeFilter(FilterSet):
             "author",
             "is_in_shopping_cart",
             "is_favorited",
+            "search",
         )
 
     def get_is_in_shopping_cart(self, queryset, _, value):
         """Фильтр для товаров в корзине."""
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shoppingcarts__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
     def get_is_in_favorite(self, queryset, _, value):
         """Фильтр для рецептов, добавленных в избранное."""
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
+
+    def get_search(self, queryset, _, value):
+        """Полнотекстовый поиск с нечетким совпадением по названию."""
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type="websearch",
+        )
+        return queryset.annotate(
+            rank=SearchRank(F("search_vector"), query),
+            similarity=TrigramSimilarity("name", value),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by(
+            F("rank").desc(nulls_last=True), "-similarity", "-pub_date",
+        )
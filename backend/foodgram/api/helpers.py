@@ -1,25 +1,196 @@
 """Модуль для миксинов и вспомогательных утилит."""
-import uuid
-import random
+import csv
+import hashlib
+import hmac
 import logging
+import os
+import string
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
 
-from recipes.constants import LENGTH_SHORT_LINK
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.constants import (
+    LENGTH_SHORT_LINK, SHOPPING_LIST_CHUNK_SIZE, SHORT_LINK_BITS,)
 
 
 logger = logging.getLogger(__name__)
 
 
 class ShortLink:
-    """ Создание короткой уникальной ссылки."""
+    """Короткая ссылка рецепта: обратимое кодирование его id.
+
+    Id перемешивается сетью Фейстеля с ключом из настроек и записывается
+    в base62 фиксированной длины, поэтому коды уникальны без проверок
+    в базе и по коду восстанавливается id.
+    """
+
+    ALPHABET = string.digits + string.ascii_letters
+    ROUNDS = 4
+    HALF_BITS = SHORT_LINK_BITS // 2
+    HALF_MASK = (1 << HALF_BITS) - 1
+
+    @classmethod
+    def encode(cls, recipe_id):
+        """Возвращает код короткой ссылки для id рецепта."""
+        value = cls._permute(recipe_id)
+        chars = []
+        for _ in range(LENGTH_SHORT_LINK):
+            value, index = divmod(value, len(cls.ALPHABET))
+            chars.append(cls.ALPHABET[index])
+        return "".join(reversed(chars))
+
+    @classmethod
+    def decode(cls, code):
+        """Возвращает id рецепта по коду или None для чужого кода."""
+        if len(code) != LENGTH_SHORT_LINK:
+            return None
+        value = 0
+        for char in code:
+            index = cls.ALPHABET.find(char)
+            if index == -1:
+                return None
+            value = value * len(cls.ALPHABET) + index
+        if value >> SHORT_LINK_BITS:
+            return None
+        return cls._permute(value, inverse=True)
+
+    @classmethod
+    def _permute(cls, value, inverse=False):
+        left, right = value >> cls.HALF_BITS, value & cls.HALF_MASK
+        rounds = range(cls.ROUNDS)
+        if inverse:
+            left, right = right, left
+            rounds = reversed(rounds)
+        for round_number in rounds:
+            left, right = right, left ^ cls._round(round_number, right)
+        if inverse:
+            left, right = right, left
+        return (left << cls.HALF_BITS) | right
+
+    @classmethod
+    def _round(cls, round_number, half):
+        digest = hmac.new(
+            settings.SHORT_LINK_SECRET.encode(),
+            b"%d:%d" % (round_number, half),
+            hashlib.sha256,
+        ).digest()
+        return int.from_bytes(digest[:8], "big") & cls.HALF_MASK
+
+
+class _Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+@lru_cache(maxsize=None)
+def _get_pdf_font():
+    """Регистрирует шрифт с кириллицей, если он установлен."""
+    if os.path.isfile(settings.SHOPPING_LIST_FONT):
+        pdfmetrics.registerFont(
+            TTFont("ShoppingListFont", settings.SHOPPING_LIST_FONT),
+        )
+        return "ShoppingListFont"
+
+    logger.warning(
+        "Font %s not found, PDF will use Helvetica",
+        settings.SHOPPING_LIST_FONT,
+    )
+    return "Helvetica"
+
+
+class ShoppingList:
+    """Потоковая выгрузка списка покупок в разных форматах.
+
+    Строки списка — кортежи (название, единица измерения, количество),
+    читаются из итератора по мере отправки ответа.
+    """
+
+    TITLE = "Список покупок"
+    CSV_HEADER = ("Ингредиент", "Единица измерения", "Количество",)
+    PDF_FONT_SIZE = 11
+    PDF_LEADING = 16
+    PDF_MARGIN = 20 * mm
+    PDF_SPOOL_SIZE = 1024 * 1024
+    PDF_READ_SIZE = 64 * 1024
+
+    @classmethod
+    def export(cls, items, file_format):
+        """Возвращает генератор байтов файла в нужном формате."""
+        exporters = {
+            "txt": cls.as_text,
+            "csv": cls.as_csv,
+            "pdf": cls.as_pdf,
+        }
+        return exporters[file_format](items)
+
     @staticmethod
-    def create_short_link(length=LENGTH_SHORT_LINK):
-        """Создает короткую ссылку."""
-        u1 = uuid.uuid5(uuid.NAMESPACE_DNS, uuid.uuid4().hex)
-        u2 = uuid.uuid5(uuid.NAMESPACE_DNS, uuid.uuid4().hex)
+    def _encode_chunks(lines):
+        """Склеивает строки в куски, чтобы не писать в сокет построчно."""
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= SHOPPING_LIST_CHUNK_SIZE:
+                yield "".join(chunk).encode("utf-8")
+                chunk = []
+        if chunk:
+            yield "".join(chunk).encode("utf-8")
+
+    @classmethod
+    def as_text(cls, items):
+        """Список покупок в текстовом виде."""
+        return cls._encode_chunks(
+            "%s (%s) — %s\n" % (name, unit, amount)
+            for name, unit, amount in items
+        )
+
+    @classmethod
+    def as_csv(cls, items):
+        """Список покупок в CSV с BOM для табличных редакторов."""
+        writer = csv.writer(_Echo())
+        yield ("\ufeff" + writer.writerow(cls.CSV_HEADER)).encode("utf-8")
+        yield from cls._encode_chunks(
+            writer.writerow(item) for item in items
+        )
+
+    @classmethod
+    def as_pdf(cls, items):
+        """Список покупок в PDF через временный файл."""
+        font = _get_pdf_font()
+        width, height = A4
+        top = height - cls.PDF_MARGIN
 
-        combined = u1.hex + u2.hex
+        with SpooledTemporaryFile(max_size=cls.PDF_SPOOL_SIZE) as buffer:
+            pdf = canvas.Canvas(buffer, pagesize=A4)
+            pdf.setTitle(cls.TITLE)
+            pdf.setFont(font, cls.PDF_FONT_SIZE + 4)
+            pdf.drawString(cls.PDF_MARGIN, top, cls.TITLE)
+            pdf.setFont(font, cls.PDF_FONT_SIZE)
+            position = top - 2 * cls.PDF_LEADING
 
-        chars = list(combined)
-        random.shuffle(chars)
+            for name, unit, amount in items:
+                if position < cls.PDF_MARGIN:
+                    pdf.showPage()
+                    pdf.setFont(font, cls.PDF_FONT_SIZE)
+                    position = top
+                pdf.drawString(
+                    cls.PDF_MARGIN,
+                    position,
+                    "%s (%s) — %s" % (name, unit, amount),
+                )
+                position -= cls.PDF_LEADING
 
-        return "".join(chars)[:length]
+            pdf.save()
+            buffer.seek(0)
+            while True:
+                chunk = buffer.read(cls.PDF_READ_SIZE)
+                if not chunk:
+                    break
+                yield chunk
@@ -0,0 +1,110 @@
+"""Модуль генерации уменьшенных копий изображений."""
+import logging
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from api.caches import recipe_fragments
+from recipes.constants import (
+    IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_QUALITY, IMAGE_VARIANT_SIZES,)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = {
+    "recipes.Recipe": (
+        "image", "image_variants", recipe_fragments.bump_recipe,
+    ),
+    "users.User": (
+        "avatar", "avatar_variants", recipe_fragments.bump_user,
+    ),
+}
+
+
+def variants_outdated(instance, update_fields=None):
+    """Проверяет, отстали ли копии от текущего изображения объекта."""
+    image_field, variants_field, _ = IMAGE_FIELDS[instance._meta.label]
+    if update_fields is not None and image_field not in update_fields:
+        return False
+    source = getattr(instance, image_field).name or None
+    return source != getattr(instance, variants_field).get("source")
+
+
+def render_variants(field_file):
+    """Сохраняет уменьшенные копии изображения и возвращает их пути."""
+    storage = field_file.storage
+    directory, filename = os.path.split(os.path.splitext(field_file.name)[0])
+
+    sizes = {}
+    with field_file.open("rb"), Image.open(field_file) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        for size_name, size in IMAGE_VARIANT_SIZES.items():
+            variant = image.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+
+            sizes[size_name] = {}
+            for image_format, extension in IMAGE_VARIANT_FORMATS.items():
+                buffer = BytesIO()
+                output = variant
+                if image_format == "jpeg":
+                    output = variant.convert("RGB")
+                output.save(
+                    buffer, image_format, quality=IMAGE_VARIANT_QUALITY,
+                )
+                sizes[size_name][image_format] = storage.save(
+                    os.path.join(
+                        directory,
+                        "variants",
+                        f"{filename}_{size_name}.{extension}",
+                    ),
+                    ContentFile(buffer.getvalue()),
+                )
+    return sizes
+
+
+def update_variants(model_label, pk):
+    """Пересчитывает уменьшенные копии изображения объекта."""
+    image_field, variants_field, bump = IMAGE_FIELDS[model_label]
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(
+        image_field, variants_field,
+    ).first()
+    if instance is None:
+        return False
+
+    field_file = getattr(instance, image_field)
+    previous = getattr(instance, variants_field)
+    variants = {}
+    if field_file:
+        variants = {
+            "source": field_file.name,
+            "sizes": render_variants(field_file),
+        }
+
+    if field_file:
+        current = Q(**{image_field: field_file.name})
+    else:
+        # После FieldFile.delete() в поле хранится пустая строка, а не NULL.
+        current = (
+            Q(**{image_field: ""}) | Q(**{f"{image_field}__isnull": True})
+        )
+    updated = model.objects.filter(current, pk=pk).update(
+        **{variants_field: variants},
+    )
+    if updated:
+        bump(pk)
+    else:
+        previous = variants
+
+    for formats in previous.get("sizes", {}).values():
+        for path in formats.values():
+            field_file.storage.delete(path)
+
+    logger.info("Image variants updated for %s %s", model_label, pk)
+    return bool(updated)
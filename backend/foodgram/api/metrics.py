@@ -0,0 +1,99 @@
+"""Модуль метрик API-сервиса в формате Prometheus.
+
+Если задана переменная PROMETHEUS_MULTIPROC_DIR, значения пишутся в
+файлы этой директории и собираются со всех процессов gunicorn.
+"""
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess,)
+
+from recipes.constants import LATENCY_BUCKETS, QUERY_COUNT_BUCKETS
+
+HTTP_METHODS = frozenset((
+    "GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS",
+))
+
+REQUEST_LATENCY = Histogram(
+    "foodgram_request_duration_seconds",
+    "Время обработки запроса",
+    ("route", "method"),
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "foodgram_requests",
+    "Количество ответов по статусам",
+    ("route", "method", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "foodgram_request_queries",
+    "Количество SQL-запросов на один запрос",
+    ("route",),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "foodgram_cache_lookups",
+    "Обращения к кэшам по результату",
+    ("cache", "result"),
+)
+DB_CONNECTIONS = Counter(
+    "foodgram_db_connections_opened",
+    "Количество открытых соединений с базой данных",
+    ("alias",),
+)
+
+
+def count_cache_lookups(name, hits, misses):
+    """Учитывает попадания и промахи кэша."""
+    if hits:
+        CACHE_LOOKUPS.labels(name, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(name, "miss").inc(misses)
+
+
+_children = {}
+
+
+def _get_children(route, method, status):
+    """Метрики с метками запроса; создаются один раз на сочетание меток."""
+    key = (route, method, status)
+    children = _children.get(key)
+    if children is None:
+        children = _children[key] = (
+            REQUEST_LATENCY.labels(route, method),
+            REQUESTS.labels(route, method, status),
+            REQUEST_QUERIES.labels(route),
+        )
+    return children
+
+
+def observe_request(request, response, duration, queries):
+    """Учитывает длительность, статус и число SQL-запросов."""
+    match = request.resolver_match
+    latency, requests, query_count = _get_children(
+        match.view_name if match else "unmatched",
+        request.method if request.method in HTTP_METHODS else "OTHER",
+        response.status_code,
+    )
+    latency.observe(duration)
+    requests.inc()
+    if queries is not None:
+        query_count.observe(queries)
+
+
+def get_registry():
+    """Реестр метрик текущего процесса или всех процессов gunicorn."""
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Отдает метрики в текстовом формате Prometheus."""
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST,
+    )
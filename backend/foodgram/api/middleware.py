@@ -0,0 +1,85 @@
+"""Модуль промежуточных слоев API-сервиса."""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import observe_request
+from api.timing import RequestTiming, current_timing
+from recipes.constants import SLOW_REQUEST_TOP_QUERIES
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware:
+    """Замеряет SQL, сериализацию и общее время каждого запроса.
+
+    Результат отдается в заголовке Server-Timing сотрудникам и в режиме
+    отладки, а медленные запросы попадают в журнал вместе с самыми
+    долгими SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = timing.activate()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            RequestTiming.deactivate(token)
+
+        total_ms = timing.total_time * 1000
+        if settings.DEBUG or getattr(request.user, "is_staff", False):
+            response["Server-Timing"] = ", ".join((
+                'db;dur=%.1f;desc="%d queries"' % (
+                    timing.sql_time * 1000, len(timing.queries),
+                ),
+                "serialize;dur=%.1f" % (timing.serialize_time * 1000),
+                "total;dur=%.1f" % total_ms,
+            ))
+        if total_ms >= settings.SLOW_REQUEST_MS:
+            self.log_slow_request(request, response, timing, total_ms)
+        return response
+
+    def log_slow_request(self, request, response, timing, total_ms):
+        """Пишет в журнал запись о медленном запросе."""
+        logger.warning("Slow request %s", json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "user": getattr(request.user, "pk", None),
+            "total_ms": round(total_ms, 2),
+            "sql_ms": round(timing.sql_time * 1000, 2),
+            "serialize_ms": round(timing.serialize_time * 1000, 2),
+            "queries": len(timing.queries),
+            "slowest": timing.slowest_queries(SLOW_REQUEST_TOP_QUERIES),
+        }, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов для Prometheus.
+
+    Ставится после RequestTimingMiddleware, чтобы взять из его замеров
+    количество SQL-запросов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        timing = current_timing()
+        observe_request(
+            request, response, time.perf_counter() - started,
+            len(timing.queries) if timing is not None else None,
+        )
+        return response
@@ -1,9 +1,13 @@
 import logging
 
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
 from rest_framework.response import Response
 from rest_framework import status
 
+from api.caches import recipe_fragments
+from api.serializers import BatchIdsSerializer
 from recipes.models import Recipe
 
 
@@ -36,7 +40,8 @@ class RecipeActionMixin:
             }
             serializer = serializer_class(data=data)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
 
             logger.info(
                 "Recipe %s added to %s for user %s",
@@ -46,10 +51,10 @@ class RecipeActionMixin:
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        instance = model_class.objects.filter(
+        deleted, _ = model_class.objects.filter(
             user=request.user, recipe=recipe,
-        )
-        if not instance.exists():
+        ).delete()
+        if not deleted:
             logger.error(
                 "Recipe %s not found in %s for user %s",
                 recipe,
@@ -61,8 +66,6 @@ class RecipeActionMixin:
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        instance.delete()
-
         logger.info(
             "Recipe %s removed from %s for user %s",
             recipe,
@@ -70,3 +73,111 @@ class RecipeActionMixin:
             request.user,
         )
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchRelationMixin:
+    """Миксин для пакетного добавления и удаления связей пользователя.
+
+    Все id проверяются одним запросом, новые связи создаются одной
+    вставкой, а в ответе возвращается результат для каждого id.
+    """
+
+    CREATED = "created"
+    EXISTS = "exists"
+    DELETED = "deleted"
+    ABSENT = "absent"
+    NOT_FOUND = "not_found"
+
+    def modify_relations_batch(
+        self,
+        request,
+        model_class,
+        field,
+        targets,
+        on_change=None,
+    ):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+
+        found = set(
+            targets.filter(pk__in=ids).values_list("pk", flat=True)
+        )
+        relations = model_class.objects.filter(
+            user=request.user, **{"%s__in" % field: found},
+        )
+        results = dict.fromkeys(ids, self.NOT_FOUND)
+        with transaction.atomic():
+            existing = set(relations.values_list(field, flat=True))
+            if request.method == "POST":
+                changed = [
+                    pk for pk in ids if pk in found and pk not in existing
+                ]
+                model_class.objects.bulk_create(
+                    [
+                        model_class(user=request.user, **{field + "_id": pk})
+                        for pk in changed
+                    ],
+                    ignore_conflicts=True,
+                )
+                results.update(dict.fromkeys(found, self.EXISTS))
+                results.update(dict.fromkeys(changed, self.CREATED))
+            else:
+                changed = list(existing)
+                relations.delete()
+                results.update(dict.fromkeys(found, self.ABSENT))
+                results.update(dict.fromkeys(changed, self.DELETED))
+
+            if changed and on_change is not None:
+                on_change(request.user, changed)
+        if changed:
+            recipe_fragments.bump_relations(request.user.id)
+
+        logger.info(
+            "User %s batch %s on %s: %d of %d changed",
+            request.user,
+            request.method,
+            model_class.__name__,
+            len(changed),
+            len(ids),
+        )
+        return Response(
+            {"results": [{"id": pk, "status": results[pk]} for pk in ids]},
+            status=status.HTTP_200_OK,
+        )
+
+
+class KeysetPaginationMixin:
+    """Миксин для курсорной пагинации по запросу клиента.
+
+    Клиент включает ее параметром курсора: пустое значение — первая
+    страница, дальше — значение из ссылки next.
+    """
+
+    keyset_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and (
+            self.keyset_pagination_class is not None
+            and self.keyset_pagination_class.cursor_query_param
+            in self.request.query_params
+        ):
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
+
+
+class ConditionalGetMixin:
+    """Миксин ответа 304 по ETag до аутентификации и выборки данных.
+
+    Подходит только для публичных данных, ETag которых не зависит от
+    пользователя: проверка выполняется раньше, чем DRF читает токен.
+    """
+
+    etag_func = None
+
+    def dispatch(self, request, *args, **kwargs):
+        dispatch = super().dispatch
+        if request.method in ("GET", "HEAD"):
+            dispatch = condition(etag_func=self.etag_func)(dispatch)
+        return dispatch(request, *args, **kwargs)
@@ -1,6 +1,15 @@
+import json
+from base64 import b64decode, b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError as BadRequest
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from recipes.constants import PAGE_SIZE
+from recipes.models import FeedEntry
 
 
 class Pagination(pagination.PageNumberPagination):
@@ -9,3 +18,148 @@ class Pagination(pagination.PageNumberPagination):
     page_size = PAGE_SIZE
     max_page_size = PAGE_SIZE
     page_size_query_param = "limit"
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Курсорная пагинация по ключу сортировки без подсчета записей.
+
+    Порядок совпадает с постраничной выдачей рецептов. Параметры, которые
+    задают свой порядок, например поиск по релевантности, с курсором
+    не сочетаются.
+    """
+
+    page_size = PAGE_SIZE
+    max_page_size = PAGE_SIZE
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    ordering = ("pub_date", "id",)
+    ordered_query_params = ("search",)
+    invalid_cursor_message = "Неверный курсор."
+    ordered_query_message = "Параметр нельзя использовать вместе с курсором."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        for param in self.ordered_query_params:
+            if request.query_params.get(param):
+                raise BadRequest({param: [self.ordered_query_message]})
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_page_size(self, request):
+        """Размер страницы из параметра запроса."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        """Ссылка на следующую страницу по последней записи текущей."""
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.get_position(self.page[-1])),
+        )
+
+    def get_position(self, item):
+        """Значения ключа сортировки записи."""
+        return [getattr(item, field.lstrip("-")) for field in self.ordering]
+
+    def get_keyset_filter(self, position):
+        """Условие «после позиции» для составного ключа сортировки."""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                previous.lstrip("-"): value
+                for previous, value in zip(self.ordering[:index], position)
+            }
+            condition |= Q(
+                **equal,
+                **{f"{field.lstrip('-')}__{lookup}": position[index]},
+            )
+
+        first = self.ordering[0]
+        bound = "lte" if first.startswith("-") else "gte"
+        return Q(**{f"{first.lstrip('-')}__{bound}": position[0]}) & condition
+
+    def encode_cursor(self, position):
+        """Кодирует позицию в строку курсора."""
+        data = json.dumps(position, default=str).encode()
+        return b64encode(data, altchars=b"-_").decode()
+
+    def decode_cursor(self, request, model):
+        """Декодирует позицию из курсора, пустой курсор — первая страница."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values = json.loads(b64decode(cursor, altchars=b"-_"))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class UserKeysetPagination(KeysetPagination):
+    """Курсорная пагинация пользователей и подписок."""
+
+    ordering = ("date_joined", "id",)
+    ordered_query_params = ()
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты подписок из нескольких источников.
+
+    Источники — выборки значений pub_date и recipe_id. Каждый режется по
+    курсору и размеру страницы отдельно, чтобы использовать свой индекс,
+    а затем они объединяются без повторов.
+    """
+
+    ordering = ("-pub_date", "-recipe_id",)
+
+    def paginate_sources(self, sources, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, FeedEntry)
+
+        pages = []
+        for source in sources:
+            source = source.order_by(*self.ordering)
+            if position is not None:
+                source = source.filter(self.get_keyset_filter(position))
+            pages.append(source[:self.page_size + 1])
+        queryset = pages[0]
+        if len(pages) > 1:
+            queryset = pages[0].union(*pages[1:]).order_by(*self.ordering)
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_position(self, item):
+        return [item[field.lstrip("-")] for field in self.ordering]
@@ -0,0 +1,41 @@
+"""Модуль рендереров для выгрузки списка покупок."""
+import json
+
+from rest_framework import renderers
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Базовый рендерер файла списка покупок.
+
+    Сам файл отдается потоком из вьюсета, рендерер выбирает формат
+    по параметру format и отображает сообщения об ошибках.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+class TextRenderer(ShoppingListRenderer):
+    """Список покупок в текстовом файле."""
+
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ShoppingListRenderer):
+    """Список покупок в CSV."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PDFRenderer(ShoppingListRenderer):
+    """Список покупок в PDF."""
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
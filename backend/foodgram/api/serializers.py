@@ -1,15 +1,23 @@
 """Модуль сериализаторов для API-сервиса."""
 import logging
 
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from djoser.serializers import UserSerializer as DjoserUser
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 
-from api.fields import Base64ImageField
+from api.fields import (
+    Base64ImageField, BulkPrimaryKeyRelatedField, ImageVariantsField,
+    get_objects_by_pk,)
+from api.timing import TimedSerializerMixin
+from recipes.constants import MAX_BATCH_IDS
 from recipes.models import (
     Favorite, Ingredient, Recipe,
     RecipeIngredient, ShoppingCart, Tag,)
+from recipes.tasks import refresh_shopping_lists
 from users.constants import MIN_PASSWORD_LENGTH
 from users.models import Follow, User
 
@@ -17,13 +25,35 @@ from users.models import Follow, User
 logger = logging.getLogger(__name__)
 
 
-class UserSerializer(DjoserUser):
+def get_recipes_limit(request):
+    """Лимит рецептов автора из параметра recipes_limit."""
+    recipes_limit = request.GET.get("recipes_limit") if request else None
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+class BatchIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BATCH_IDS,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
+
+
+class UserSerializer(TimedSerializerMixin, DjoserUser):
     """Сериализатор пользователя для получения инф о подписке и регистрации."""
 
     is_subscribed = serializers.SerializerMethodField(
         method_name="get_is_followed"
     )
     avatar = Base64ImageField()
+    avatar_variants = ImageVariantsField(image_field="avatar")
     password = serializers.CharField(
         min_length=MIN_PASSWORD_LENGTH,
         write_only=True,
@@ -35,9 +65,12 @@ class UserSerializer(DjoserUser):
         fields = DjoserUser.Meta.fields + (
             "is_subscribed",
             "avatar",
+            "avatar_variants",
         )
 
     def get_is_followed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         request = self.context.get("request")
         return (
             request
@@ -56,7 +89,7 @@ class UserSerializer(DjoserUser):
         )
 
 
-class UserAvatarSerializer(serializers.ModelSerializer):
+class UserAvatarSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для обновления аватара пользователя."""
 
     avatar = Base64ImageField()
@@ -67,7 +100,7 @@ class UserAvatarSerializer(serializers.ModelSerializer):
         fields = ("avatar",)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для тегов."""
 
     class Meta:
@@ -76,7 +109,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
 
     class Meta:
@@ -85,17 +118,29 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class CreateRecipeIngredientListSerializer(serializers.ListSerializer):
+    """Список ингредиентов рецепта, загружаемых одним запросом."""
+
+    def validate(self, attrs):
+        ingredients = get_objects_by_pk(
+            Ingredient.objects.all(),
+            [item["ingredient"] for item in attrs],
+        )
+        for item, ingredient in zip(attrs, ingredients):
+            item["ingredient"] = ingredient
+        return attrs
+
+
 class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для создания связи рецепт-ингредиент."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source="ingredient",
-    )
+    id = serializers.IntegerField(source="ingredient", min_value=1)
 
     class Meta:
 
         model = RecipeIngredient
         fields = ("id", "amount",)
+        list_serializer_class = CreateRecipeIngredientListSerializer
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -115,7 +160,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ("id", "amount", "measurement_unit", "name",)
 
 
-class GetRecipeSerializer(serializers.ModelSerializer):
+class GetRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для получения детальной информации о рецепте."""
 
     ingredients = RecipeIngredientSerializer(
@@ -125,6 +170,7 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     )
     tags = TagSerializer(read_only=True, many=True)
     author = UserSerializer(read_only=True)
+    image_variants = ImageVariantsField(image_field="image")
     is_favorited = serializers.SerializerMethodField(
         method_name="get_is_in_favorite",
     )
@@ -138,9 +184,14 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         exclude = (
             "short_link",
             "pub_date",
+            "search_vector",
+            "ingredients_updated_at",
+            "similar_updated_at",
         )
 
     def get_is_in_favorite(self, obj):
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         request = self.context.get("request")
         return (
             request
@@ -149,6 +200,8 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         request = self.context.get("request")
         return (
             request
@@ -157,7 +210,7 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipesSerializer(serializers.ModelSerializer):
+class RecipesSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецепта."""
 
     author = serializers.SlugRelatedField(
@@ -168,7 +221,7 @@ class RecipesSerializer(serializers.ModelSerializer):
     ingredients = CreateRecipeIngredientSerializer(
         many=True, source="recipe_ingredients",
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -176,7 +229,12 @@ class RecipesSerializer(serializers.ModelSerializer):
     class Meta:
 
         model = Recipe
-        fields = "__all__"
+        exclude = (
+            "search_vector",
+            "image_variants",
+            "ingredients_updated_at",
+            "similar_updated_at",
+        )
 
     def validate(self, attrs):
         tags = attrs.get("tags")
@@ -205,8 +263,17 @@ class RecipesSerializer(serializers.ModelSerializer):
 
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
-        recipe, _ = self._add_or_update_recipe_relations(validated_data)
+        ingredients = validated_data.pop("recipe_ingredients")
+        tags = validated_data.pop("tags")
+        recipe = Recipe.objects.create(**validated_data)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, **ingredient)
+            for ingredient in ingredients
+        )
+        recipe.tags.set(tags)
+
         logger.info(
             "Created new recipe: %s by user %s",
             recipe,
@@ -214,41 +281,76 @@ class RecipesSerializer(serializers.ModelSerializer):
         )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        recipe, remaining_data = self._add_or_update_recipe_relations(
-            validated_data, recipe=instance,
-        )
+        ingredients = validated_data.pop("recipe_ingredients")
+        tags = validated_data.pop("tags")
+        Recipe.objects.select_for_update().only("pk").get(pk=instance.pk)
+
+        changed_ingredients = self._update_ingredients(instance, ingredients)
+        instance.tags.set(tags)
+        if changed_ingredients:
+            validated_data["ingredients_updated_at"] = timezone.now()
+            refresh_shopping_lists.delay(
+                instance.pk,
+                list(instance.shoppingcarts.values_list("user", flat=True)),
+                sorted(changed_ingredients),
+            )
 
-        logger.info("Recipe was updated: %s", recipe)
-        return super().update(recipe, remaining_data)
+        logger.info("Recipe was updated: %s", instance)
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], *Recipe.objects.related_lookups(),
+        )
         return GetRecipeSerializer(
             instance, context=self.context,
         ).data
 
-    def _add_or_update_recipe_relations(self, validated_data, recipe=None):
-        ingredients = validated_data.pop("recipe_ingredients")
-        tags = validated_data.pop("tags")
-        if recipe is None:
-            recipe = Recipe.objects.create(**validated_data)
-        else:
-            recipe.recipe_ingredients.all().delete()
-            recipe.tags.clear()
-
-        recipe_ingredients = [
-            RecipeIngredient(recipe=recipe, **ingredient)
+    @staticmethod
+    def _update_ingredients(recipe, ingredients):
+        """Меняет в составе рецепта только отличающиеся строки."""
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient["ingredient"].id: ingredient["amount"]
             for ingredient in ingredients
+        }
+
+        removed = current.keys() - amounts.keys()
+        added = [
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in amounts.items()
+            if pk not in current
         ]
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        recipe.tags.set(tags)
-        return recipe, validated_data
+        updated = []
+        for pk, item in current.items():
+            if pk in amounts and item.amount != amounts[pk]:
+                item.amount = amounts[pk]
+                updated.append(item)
+
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed,
+            ).delete()
+        if updated:
+            RecipeIngredient.objects.bulk_update(updated, ("amount",))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+
+        return removed.union(
+            item.ingredient_id for item in updated + added
+        )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Короткий сериализатор рецепта для отображения в списках."""
 
     image = Base64ImageField(required=True)
+    image_variants = ImageVariantsField(image_field="image")
 
     class Meta:
 
@@ -257,6 +359,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
 
@@ -277,22 +380,25 @@ class GetFollowSerializer(UserSerializer):
         )
 
     def get_recipe(self, author):
-        request = self.context.get("request")
-        recipes = author.recipes.all()
-        recipes_limit = request.GET.get("recipes_limit") if request else None
-
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(author, "latest_recipes"):
+            recipes = author.latest_recipes
+        else:
+            request = self.context.get("request")
+            recipes = Recipe.objects.latest_by_author(
+                [author], get_recipes_limit(request),
+            )
 
         return RecipeSerializer(
             recipes, many=True, context=self.context
         ).data
 
     def get_recipes_count(self, user):
+        if hasattr(user, "recipes_count"):
+            return user.recipes_count
         return user.recipes.count()
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для создания подписки."""
 
     ERROR_SELF_FOLLOW = "Попытка подписаться на самого себя."
@@ -320,7 +426,9 @@ class FollowSerializer(serializers.ModelSerializer):
         ).data
 
 
-class UserRecipeRelationSerializerMixin(serializers.ModelSerializer):
+class UserRecipeRelationSerializerMixin(
+    TimedSerializerMixin, serializers.ModelSerializer,
+):
     """Миксин для связей пользователь-рецепт."""
 
     class Meta:
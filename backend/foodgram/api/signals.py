@@ -0,0 +1,137 @@
+"""Модуль обработчиков сигналов API-сервиса.
+
+Версии кэшей меняются только после коммита: иначе параллельный запрос
+успел бы прочитать новую версию вместе со старыми строками и сохранить
+их под новым ключом.
+"""
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_version_key
+from api.caches import (
+    bump_version, ingredient_index, recipe_fragments, tag_index,)
+from api.images import variants_outdated
+from api.metrics import DB_CONNECTIONS
+from api.tasks import update_image_variants
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag,)
+from users.models import Follow
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает индекс ингредиентов при их изменении."""
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_catalog(**kwargs):
+    """Сбрасывает кэш рецептов при изменении справочников."""
+    transaction.on_commit(recipe_fragments.bump_catalog)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сбрасывает индекс и ETag справочника тегов."""
+    transaction.on_commit(tag_index.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    """Сбрасывает кэш рецепта при его изменении."""
+    transaction.on_commit(partial(recipe_fragments.bump_recipe, instance.pk))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    """Сбрасывает кэш рецепта при изменении его ингредиентов."""
+    transaction.on_commit(
+        partial(recipe_fragments.bump_recipe, instance.recipe_id),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кэш рецептов при изменении их тегов."""
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        transaction.on_commit(
+            partial(recipe_fragments.bump_recipe, instance.pk),
+        )
+    elif pk_set:
+        for recipe_id in pk_set:
+            transaction.on_commit(
+                partial(recipe_fragments.bump_recipe, recipe_id),
+            )
+    else:
+        transaction.on_commit(recipe_fragments.bump_catalog)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+def invalidate_user_relations(instance, **kwargs):
+    """Сбрасывает ETag рецептов с флагами пользователя."""
+    transaction.on_commit(
+        partial(recipe_fragments.bump_relations, instance.user_id),
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, **kwargs):
+    """Прибавляет рецепт новой корзины к списку покупок."""
+    if created:
+        with transaction.atomic(savepoint=False):
+            ShoppingListItem.objects.add_recipe(
+                instance.user, instance.recipe,
+            )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, **kwargs):
+    """Вычитает рецепт корзины из списка покупок.
+
+    Срабатывает и при каскадном удалении корзин вместе с рецептом или
+    его автором, в том числе из админки.
+    """
+    ShoppingListItem.objects.remove_cart(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(instance, **kwargs):
+    """Сбрасывает кэш рецептов автора при изменении его профиля."""
+    transaction.on_commit(partial(recipe_fragments.bump_user, instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    """Сбрасывает кэш аутентификации при удалении токена."""
+    transaction.on_commit(
+        partial(bump_version, token_version_key(instance.user_id)),
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def schedule_image_variants(instance, update_fields, **kwargs):
+    """Запускает пересчет копий изображения после его замены."""
+    if variants_outdated(instance, update_fields):
+        update_image_variants.delay(instance._meta.label, instance.pk)
+
+
+@receiver(connection_created)
+def count_db_connection(connection, **kwargs):
+    """Учитывает открытие нового соединения с базой данных."""
+    DB_CONNECTIONS.labels(connection.alias).inc()
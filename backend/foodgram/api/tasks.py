@@ -0,0 +1,9 @@
+"""Модуль фоновых задач API-сервиса."""
+from api.images import update_variants
+from tasks.registry import task
+
+
+@task
+def update_image_variants(model_label, pk):
+    """Пересчитывает уменьшенные копии изображения объекта."""
+    update_variants(model_label, pk)
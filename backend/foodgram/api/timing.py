@@ -0,0 +1,96 @@
+"""Модуль для замеров времени обработки запросов."""
+import re
+import time
+from contextvars import ContextVar
+
+SQL_LITERAL = re.compile(r"%s|\b\d+\b|'(?:[^']|'')*'")
+SQL_LIST = re.compile(r"\(\?(?:, \?)+\)")
+
+_current = ContextVar("request_timing", default=None)
+
+
+def normalize_sql(sql):
+    """Приводит запрос к виду без значений для группировки."""
+    return SQL_LIST.sub("(...)", SQL_LITERAL.sub("?", sql))
+
+
+def current_timing():
+    """Возвращает замеры текущего запроса, если они ведутся."""
+    return _current.get()
+
+
+class RequestTiming:
+    """Замеры одного запроса: SQL, сериализация и общее время."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    def activate(self):
+        """Делает замеры текущими для контекста запроса."""
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        """Возвращает предыдущие замеры контекста."""
+        _current.reset(token)
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка выполнения SQL для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.sql_time += duration
+            self.queries.append((sql, duration))
+
+    def slowest_queries(self, limit):
+        """Самые долгие запросы, сгруппированные без учета значений."""
+        statements = {}
+        for sql, duration in self.queries:
+            statement = statements.setdefault(
+                normalize_sql(sql), {"count": 0, "time": 0.0},
+            )
+            statement["count"] += 1
+            statement["time"] += duration
+        return sorted(
+            (
+                {
+                    "sql": sql,
+                    "count": statement["count"],
+                    "ms": round(statement["time"] * 1000, 2),
+                }
+                for sql, statement in statements.items()
+            ),
+            key=lambda statement: statement["ms"],
+            reverse=True,
+        )[:limit]
+
+
+class TimedSerializerMixin:
+    """Учитывает время сериализации в замерах текущего запроса.
+
+    Вложенные сериализаторы не засчитываются повторно: время набегает
+    только на верхнем уровне представления.
+    """
+
+    def to_representation(self, instance):
+        timing = _current.get()
+        if timing is None or timing.serializing:
+            return super().to_representation(instance)
+
+        timing.serializing = True
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timing.serialize_time += time.perf_counter() - started
+            timing.serializing = False
@@ -1,90 +1,114 @@
 """Модуль вьюсетов для API-сервиса."""
 import logging
-from io import BytesIO
 
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.permissions import (
     IsAuthenticated, IsAuthenticatedOrReadOnly,)
 from rest_framework.response import Response
 
+from api.caches import (
+    get_celebrity_ids, ingredient_index, recipe_fragments,)
+from api.etags import ingredients_etag, recipe_etag, tags_etag, user_etag
 from api.filters import IngredientFilter, RecipeFilter
-from api.helpers import ShortLink
-from api.mixins import RecipeActionMixin
-from api.paginations import Pagination
+from api.helpers import ShoppingList, ShortLink
+from api.mixins import (
+    BatchRelationMixin, ConditionalGetMixin, KeysetPaginationMixin,
+    RecipeActionMixin,)
+from api.paginations import (
+    FeedPagination, KeysetPagination, Pagination, UserKeysetPagination,)
 from api.permissions import OwnerOrReadOnly
+from api.renderers import CSVRenderer, PDFRenderer, TextRenderer
 from api.serializers import (
-    FavoriteSerializer, FollowSerializer,
-    GetFollowSerializer, IngredientSerializer, RecipesSerializer,
+    FavoriteSerializer, FollowSerializer, GetFollowSerializer,
+    GetRecipeSerializer, IngredientSerializer, RecipesSerializer,
     ShoppingCartSerializer, TagSerializer, UserAvatarSerializer,
-    UserSerializer,)
-from recipes.constants import MAX_LINK_POSTFIX, URL
+    UserSerializer, get_recipes_limit,)
+from recipes.constants import (
+    SHOPPING_LIST_CHUNK_SIZE, SIMILAR_RECIPES_COUNT, URL,)
 from recipes.models import (
-    Favorite, Ingredient, Recipe,
-    RecipeIngredient, ShoppingCart,
-    Tag,)
+    Favorite, FeedEntry, Ingredient, Recipe,
+    ShoppingCart, ShoppingListItem,
+    SimilarRecipe, Tag,)
+from recipes.tasks import fan_out_recipe, sync_feed
 from users.models import Follow
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
-class RecipesViewSet(RecipeActionMixin, viewsets.ModelViewSet):
+class RecipesViewSet(
+    KeysetPaginationMixin, RecipeActionMixin, BatchRelationMixin,
+    viewsets.ModelViewSet,
+):
     """Вьюсет для работы с рецептами."""
 
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = Pagination
+    keyset_pagination_class = KeysetPagination
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
     permission_classes = (IsAuthenticatedOrReadOnly, OwnerOrReadOnly,)
     queryset = Recipe.objects.all()
     serializer_class = RecipesSerializer
 
+    def get_queryset(self):
+        """Рецепты с флагами текущего пользователя."""
+        return super().get_queryset().with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов из кэша фрагментов."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                recipe_fragments.render(page, GetRecipeSerializer, request),
+            )
+        return Response(
+            recipe_fragments.render(queryset, GetRecipeSerializer, request),
+        )
+
+    @method_decorator(condition(etag_func=recipe_etag))
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт из кэша фрагментов."""
+        recipe = self.get_object()
+        return Response(
+            recipe_fragments.render([recipe], GetRecipeSerializer, request)[0],
+        )
+
     def perform_create(self, serializer):
         """Создает рецепт пользователем в БД."""
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        recipe.short_link = ShortLink.encode(recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            short_link=recipe.short_link,
+        )
+        fan_out_recipe.delay(recipe.pk)
         logger.info("Recipe created by user %s", self.request.user)
 
-    @staticmethod
-    def _generate_unique_short_link():
-        """Генерирует уникальный короткий идентификатор для рецепта."""
-        short_link = ShortLink.create_short_link(MAX_LINK_POSTFIX)
-        while Recipe.objects.filter(short_link=short_link).exists():
-            short_link = ShortLink.create_short_link(MAX_LINK_POSTFIX)
-        return short_link
-
     @action(
         methods=("GET",),
         detail=True,
         url_path="get-link",
     )
     def generate_short_link(self, request, pk):
-        """Генерирует короткую ссылку."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-
-        if recipe.short_link:
-            logger.info("Short link to recipe %s exists", recipe)
-            return Response(
-                {"short-link": URL + recipe.short_link},
-                status=status.HTTP_200_OK,
-            )
+        """Возвращает короткую ссылку на рецепт."""
+        recipe = get_object_or_404(Recipe.objects.only("short_link"), pk=pk)
+        short_link = recipe.short_link or ShortLink.encode(recipe.pk)
 
-        unique_short_link = self._generate_unique_short_link()
-        recipe.short_link = unique_short_link
-        recipe.save(update_fields=["short_link"])
-
-        logger.info(
-            "Short link %s created for recipe %s",
-            unique_short_link,
-            recipe,
-        )
+        logger.info("Short link %s requested for recipe %s", short_link, pk)
         return Response(
-            {"short-link": URL + unique_short_link},
+            {"short-link": URL + short_link},
             status=status.HTTP_200_OK,
         )
 
@@ -112,65 +136,152 @@ class RecipesViewSet(RecipeActionMixin, viewsets.ModelViewSet):
             request, pk, ShoppingCartSerializer, ShoppingCart,
         )
 
+    @action(
+        methods=("POST", "DELETE",),
+        detail=False,
+        url_path="favorite",
+        url_name="favorite-batch",
+        permission_classes=(IsAuthenticated,),
+    )
+    def batch_favorite(self, request):
+        """Пакетное добавление и удаление рецептов в избранном."""
+        return self.modify_relations_batch(
+            request, Favorite, "recipe", Recipe.objects.all(),
+        )
+
+    @action(
+        methods=("POST", "DELETE",),
+        detail=False,
+        url_path="shopping_cart",
+        url_name="shopping-cart-batch",
+        permission_classes=(IsAuthenticated,),
+    )
+    def batch_shopping_cart(self, request):
+        """Пакетное добавление и удаление рецептов в корзине.
+
+        Массовая вставка не отправляет сигналов, поэтому суммы
+        добавленных рецептов пересчитываются явно, а удаленные
+        вычитаются сигналом корзины.
+        """
+        return self.modify_relations_batch(
+            request, ShoppingCart, "recipe", Recipe.objects.all(),
+            on_change=(
+                ShoppingListItem.objects.refresh_recipes
+                if request.method == "POST" else None
+            ),
+        )
+
+    @action(
+        methods=("GET",),
+        detail=True,
+        url_path="similar",
+    )
+    def similar(self, request, pk):
+        """Похожие рецепты, заранее рассчитанные по составу."""
+        recipe = self.get_object()
+        similar_ids = list(
+            SimilarRecipe.objects.filter(recipe=recipe)
+            .order_by("-score", "similar_id")
+            .values_list("similar_id", flat=True)[:SIMILAR_RECIPES_COUNT]
+        )
+        recipes = self.get_queryset().in_bulk(similar_ids)
+        return Response(recipe_fragments.render(
+            [recipes[pk] for pk in similar_ids if pk in recipes],
+            GetRecipeSerializer,
+            request,
+        ))
+
+    @action(
+        methods=("GET",),
+        detail=False,
+        url_path="feed",
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination,
+        keyset_pagination_class=FeedPagination,
+    )
+    def feed(self, request):
+        """Лента рецептов авторов из подписок пользователя."""
+        sources = [
+            FeedEntry.objects.filter(user=request.user)
+            .values("pub_date", "recipe_id"),
+        ]
+        celebrities = Follow.objects.filter(
+            user=request.user, following__in=get_celebrity_ids(),
+        ).values("following")
+        if celebrities.exists():
+            sources.append(
+                Recipe.objects.filter(author__in=celebrities)
+                .annotate(recipe_id=F("id"))
+                .values("pub_date", "recipe_id")
+            )
+
+        page = self.paginator.paginate_sources(sources, request)
+        recipes = self.get_queryset().in_bulk(
+            [entry["recipe_id"] for entry in page],
+        )
+        return self.get_paginated_response(recipe_fragments.render(
+            [
+                recipes[entry["recipe_id"]] for entry in page
+                if entry["recipe_id"] in recipes
+            ],
+            GetRecipeSerializer,
+            request,
+        ))
+
     @action(
         methods=("GET",),
         detail=False,
         url_path="download_shopping_cart",
         permission_classes=(IsAuthenticated,),
+        renderer_classes=(TextRenderer, CSVRenderer, PDFRenderer,),
     )
     def download_shopping_cart(self, request):
-        """Скачать корзину рецептов."""
+        """Скачать корзину рецептов в формате txt, csv или pdf."""
         logger.info(
             "User %s requested to download shopping cart", request.user,
         )
         ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shoppingcarts__user=request.user,
-            )
-            .values(
+            ShoppingListItem.objects.filter(user=request.user)
+            .values_list(
                 "ingredient__name",
                 "ingredient__measurement_unit",
+                "total_amount",
             )
-            .annotate(total_amount=Sum("amount"))
             .order_by("ingredient__name")
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        )
+        return self.create_shopping_list_response(
+            ingredients, request.accepted_renderer,
         )
-        shopping_list = self.prepare_shopping_list(ingredients)
-        return self.create_shopping_list_response(shopping_list)
-
-    def prepare_shopping_list(self, ingredients):
-        """Формирование списка покупок."""
-        lines = [
-            "%s (%s) — %s" % (
-                item["ingredient__name"],
-                item["ingredient__measurement_unit"],
-                item["total_amount"]
-            )
-            for item in ingredients
-        ]
-        shopping_list = "\n".join(lines)
 
-        logger.debug("Prepared shopping list: %s", shopping_list)
-        return shopping_list
+    def create_shopping_list_response(self, ingredients, renderer):
+        """Потоковый ответ с файлом списка покупок."""
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += "; charset=%s" % renderer.charset
 
-    def create_shopping_list_response(self, shopping_list):
-        """Ответ с файлом списка покупок."""
-        file_buffer = BytesIO(shopping_list.encode("utf-8"))
-        response = FileResponse(file_buffer, content_type="text/plain")
+        response = StreamingHttpResponse(
+            ShoppingList.export(ingredients, renderer.format),
+            content_type=content_type,
+        )
         response["Content-Disposition"] = (
             "attachment; "
-            "filename=\"shopping_list.txt\""
+            "filename=\"shopping_list.%s\"" % renderer.format
         )
 
         logger.info("Shopping list response created")
         return response
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(
+    KeysetPaginationMixin, BatchRelationMixin, DjoserUserViewSet,
+):
     """Вьюсет для работы с пользователями."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = Pagination
+    keyset_pagination_class = UserKeysetPagination
 
     def get_serializer_class(self):
         """Получить класс сериализатора."""
@@ -185,6 +296,7 @@ class UserViewSet(DjoserUserViewSet):
         url_path="me",
         permission_classes=(IsAuthenticated,),
     )
+    @method_decorator(condition(etag_func=user_etag))
     def me(self, request):
         """Запрос пользователем профиля."""
         logger.info("User %s requested their profile", request.user)
@@ -197,6 +309,7 @@ class UserViewSet(DjoserUserViewSet):
         detail=False,
         url_path="me/avatar",
         permission_classes=(IsAuthenticated,),
+        parser_classes=(JSONParser, MultiPartParser, FormParser),
     )
     def user_avatar(self, request):
         """Изменение или удаление аватара."""
@@ -252,6 +365,26 @@ class UserViewSet(DjoserUserViewSet):
         )
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        methods=("POST", "DELETE",),
+        detail=False,
+        url_path="subscribe",
+        url_name="subscribe-batch",
+        permission_classes=(IsAuthenticated,),
+    )
+    def batch_subscribe(self, request):
+        """Пакетная подписка и отписка, кроме подписки на себя."""
+        return self.modify_relations_batch(
+            request, Follow, "following",
+            User.objects.exclude(pk=request.user.pk),
+            on_change=self._sync_feed if request.method == "POST" else None,
+        )
+
+    @staticmethod
+    def _sync_feed(user, author_ids):
+        """Обновляет ленту после подписки, bulk_create не шлет сигналы."""
+        sync_feed.delay(user.pk, author_ids)
+
     @action(
         methods=("GET",),
         detail=False,
@@ -260,10 +393,22 @@ class UserViewSet(DjoserUserViewSet):
     )
     def get_subscriptions(self, request):
         """Получение подписок."""
-        user = get_object_or_404(User, username=request.user.username)
-        following_users = User.objects.filter(following__user=user)
+        recipes_count = (
+            Recipe.objects.filter(author=OuterRef("pk"))
+            .order_by()
+            .values("author")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        following_users = User.objects.filter(
+            followers__user=request.user,
+        ).annotate(
+            recipes_count=Coalesce(Subquery(recipes_count), 0),
+            is_subscribed=Value(True),
+        )
 
         result_page = self.paginate_queryset(following_users)
+        self._attach_latest_recipes(result_page, get_recipes_limit(request))
         serializer = GetFollowSerializer(
             result_page, many=True, context={"request": request},
         )
@@ -271,28 +416,53 @@ class UserViewSet(DjoserUserViewSet):
         logger.info("User %s requested subscriptions", request.user)
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def _attach_latest_recipes(authors, limit):
+        """Подставляет авторам последние рецепты одним запросом."""
+        authors = list(authors)
+        latest_recipes = {author.id: [] for author in authors}
+        for recipe in Recipe.objects.latest_by_author(authors, limit):
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest_recipes[author.id]
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
 
+    etag_func = staticmethod(tags_etag)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
 
+    etag_func = staticmethod(ingredients_etag)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Автодополнение по названию обслуживается индексом в памяти."""
+        name = request.query_params.get("name")
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
 
 def redirect_to_recipe_detail(request, short_link_code):
     """Редирект на детальную страницу рецепта."""
-    recipe = get_object_or_404(Recipe, short_link=short_link_code)
+    recipe = Recipe.objects.filter(short_link=short_link_code).first()
+    if recipe is None:
+        recipe = get_object_or_404(
+            Recipe,
+            pk=ShortLink.decode(short_link_code),
+            short_link__isnull=True,
+        )
 
     logger.info("Redirecting to recipe detail for recipe %s", recipe)
-    return redirect("api:recipe-detail", pk=recipe.id)
+    return redirect("api:api:recipes-detail", pk=recipe.id)
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -7,6 +8,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "")
 
+SHORT_LINK_SECRET = os.getenv("SHORT_LINK_SECRET", SECRET_KEY)
+
 DEBUG = os.getenv("DJANGO_DEBUG", "false").lower() == "true"
 
 ALLOWED_HOSTS = os.getenv("DJANGO_ALLOWED_HOSTS", "localhost").split(",") + ["127.0.0.1", "backend"]
@@ -22,6 +25,7 @@ DJANGO_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 THIRD_PARTY_APPS = [
     "rest_framework",
@@ -33,6 +37,7 @@ LOCAL_APPS = [
     "users.apps.UsersConfig",
     "recipes.apps.RecipesConfig",
     "api.apps.ApiConfig",
+    "tasks.apps.TasksConfig",
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -40,6 +45,8 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 AUTH_USER_MODEL = "users.User"
 
 MIDDLEWARE = [
+    "api.middleware.RequestTimingMiddleware",
+    "api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -68,6 +75,8 @@ TEMPLATES = [
     },
 ]
 
+SLOW_REQUEST_MS = float(os.getenv("DJANGO_SLOW_REQUEST_MS", "1000"))
+
 WSGI_APPLICATION = "config.wsgi.application"
 
 DATABASES = {
@@ -81,6 +90,13 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "foodgram"),
+        "OPTIONS": json.loads(os.getenv("DJANGO_CACHE_OPTIONS", '{"MAX_ENTRIES": 10000}')),
+    }
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -99,7 +115,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -133,3 +149,5 @@ DJOSER = {
         "user": ("rest_framework.permissions.IsAuthenticatedOrReadOnly",),
     },
 }
+
+SHOPPING_LIST_FONT = os.getenv("SHOPPING_LIST_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
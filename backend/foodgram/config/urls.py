@@ -1,11 +1,13 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.metrics import metrics_view
 from api.views import redirect_to_recipe_detail
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path(
         "s/<slug:short_link_code>/",
         redirect_to_recipe_detail,
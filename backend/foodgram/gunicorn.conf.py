@@ -0,0 +1,18 @@
+"""Настройки gunicorn для сбора метрик со всех процессов."""
+import os
+import shutil
+
+
+def on_starting(server):
+    """Очищает файлы метрик предыдущего запуска."""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Помечает метрики завершившегося процесса."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
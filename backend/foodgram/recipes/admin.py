@@ -1,10 +1,25 @@
+from collections import defaultdict
+
 from django.contrib import admin
 from django.db.models import Count
 from recipes.models import (
     Tag, Ingredient, Recipe,
     RecipeIngredient, Favorite,
-    ShoppingCart,
+    ShoppingCart, ShoppingListItem,
 )
+from recipes.tasks import refresh_shopping_lists
+
+
+def ingredients_changed(recipe_ids):
+    """Отмечает изменение состава рецептов и пересчитывает корзины."""
+    Recipe.objects.filter(pk__in=recipe_ids).mark_ingredients_updated()
+    owners = defaultdict(list)
+    for recipe_id, user_id in ShoppingCart.objects.filter(
+        recipe__in=recipe_ids,
+    ).values_list("recipe", "user"):
+        owners[recipe_id].append(user_id)
+    for recipe_id, user_ids in owners.items():
+        refresh_shopping_lists.delay(recipe_id, user_ids)
 
 
 @admin.register(Tag)
@@ -68,6 +83,11 @@ class RecipeAdmin(admin.ModelAdmin):
         queryset = queryset.annotate(favorites_count=Count('favorites'))
         return queryset
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        if formset.model is RecipeIngredient and formset.has_changed():
+            ingredients_changed([form.instance.pk])
+
     @admin.display(description="В избранном")
     def favorites_count(self, obj):
         return obj.favorites_count
@@ -100,6 +120,20 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         "ingredient__name",
     )
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recipes = {obj.recipe_id, form.initial.get("recipe")}
+        ingredients_changed(recipes - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ingredients_changed([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipes = set(queryset.values_list("recipe", flat=True))
+        super().delete_queryset(request, queryset)
+        ingredients_changed(recipes)
+
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
@@ -137,3 +171,32 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         "recipe__name",
     )
     ordering = ("-pub_date",)
+
+    def get_readonly_fields(self, request, obj=None):
+        """Пользователь и рецепт сохраненной корзины не меняются.
+
+        Суммы списка покупок пересчитываются только при добавлении и
+        удалении корзины.
+        """
+        if obj is not None:
+            return ("user", "recipe",)
+        return ()
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "user",
+        "ingredient",
+        "total_amount",
+    )
+    search_fields = (
+        "user__username",
+        "ingredient__name",
+    )
+    readonly_fields = (
+        "user",
+        "ingredient",
+        "total_amount",
+    )
@@ -6,3 +6,6 @@ class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
     verbose_name = "Управление рецептами"
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
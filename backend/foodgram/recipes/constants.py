@@ -4,9 +4,9 @@ PAGE_SIZE = 6  # Максимальное количество постов на
 MIN_COOKING_TIME = 1  # Минимальное время приготовления блюда.
 MIN_SUM_INGREDIENT = 1  # Минимальное кол-во ингредиентов для блюда.
 
-LENGTH_SHORT_LINK = 12  # Длина короткой ссылки.
+LENGTH_SHORT_LINK = 8  # Длина короткой ссылки.
+SHORT_LINK_BITS = 46  # Разрядность кодируемого id рецепта.
 MAX_VIEW_LENGTH = 20  # Максимальная длинна символов на предпросмотре блюда.
-MAX_LINK_POSTFIX = 20  # Максимальная длина генерируемой ссылки.
 MAX_LINK_LENGTH = 255  # Максимальная длина ссылки.
 MAX_LENGTH_OF_FIELDS = 150  # Максимальная длина поля.
 MAX_LENGTH_TITLE_RECIPE = 255  # Максималая длина заголовка рецепта.
@@ -14,3 +14,36 @@ MAX_LENGTH_OF_TAGS = 32  # Максимальная длина для полей
 MAX_LENGTH_OF_RECIPE_NAME = 128  # Максимальная длина для названия рецепта.
 MAX_LENGTH_OF_RECIPE_UNIT = 64  # Максимальная длина для единицы измерения.
 URL = "https://foodgramevans.serveftp.com/s/"  # Редирект на детали рецепта.
+INGREDIENT_INDEX_TTL = 300  # Время жизни индекса ингредиентов в секундах.
+TAG_INDEX_TTL = 300  # Время жизни индекса тегов в секундах.
+SEARCH_CONFIG = "russian"  # Конфигурация полнотекстового поиска.
+BATCH_SIZE = 1000  # Размер пачки при массовых обновлениях.
+SHOPPING_LIST_CHUNK_SIZE = 500  # Строк списка покупок за одно чтение.
+RECIPE_FRAGMENT_TTL = 24 * 60 * 60  # Время жизни кэша рецепта в секундах.
+MAX_IMAGE_SIZE = 5 * 1024 * 1024  # Максимальный размер изображения в байтах.
+MAX_IMAGE_PIXELS = 25 * 1000 * 1000  # Максимальное число пикселей.
+BASE64_CHUNK_SIZE = 64 * 1024  # Символов base64 за один шаг, кратно 4.
+IMAGE_VARIANT_SIZES = {
+    "small": (320, 320),
+    "medium": (960, 960),
+}  # Размеры уменьшенных копий изображений.
+IMAGE_VARIANT_FORMATS = {
+    "jpeg": "jpg",
+    "webp": "webp",
+}  # Форматы уменьшенных копий и расширения их файлов.
+IMAGE_VARIANT_QUALITY = 80  # Качество сжатия уменьшенных копий.
+FIXTURE_CHUNK_SIZE = 10000  # Объектов в одной пачке генерации данных.
+SLOW_REQUEST_TOP_QUERIES = 5  # Самых долгих SQL в журнале медленных запросов.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)  # Границы гистограммы времени ответа в секундах.
+QUERY_COUNT_BUCKETS = (
+    0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89,
+)  # Границы гистограммы числа SQL-запросов.
+MAX_BATCH_IDS = 100  # Максимум id в одном пакетном запросе.
+FEED_FANOUT_LIMIT = 10000  # Подписчиков, при которых лента строится на чтении.
+FEED_BACKFILL_SIZE = 50  # Последних рецептов автора в ленте после подписки.
+FEED_CELEBRITIES_TTL = 600  # Время жизни списка популярных авторов в секундах.
+SIMILAR_RECIPES_COUNT = 10  # Похожих рецептов, хранимых для каждого рецепта.
+SIMILAR_BLOCK_SIZE = 500  # Рецептов в одной пачке пересчета похожих.
+SIMILAR_MAX_POSTINGS = 10000  # Рецептов, с которых ингредиент не учитывается.
@@ -0,0 +1,311 @@
+import json
+import os
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases,
+    setup_test_environment, teardown_databases, teardown_test_environment,)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+DATASETS = {
+    "small": {
+        "users": 200, "recipes": 1000, "favorites": 2000,
+        "carts": 1000, "follows": 2000,
+    },
+    "medium": {
+        "users": 2000, "recipes": 20000, "favorites": 40000,
+        "carts": 10000, "follows": 40000,
+    },
+    "large": {
+        "users": 20000, "recipes": 200000, "favorites": 400000,
+        "carts": 100000, "follows": 400000,
+    },
+}
+BUDGET_METRICS = ("queries", "wall_ms", "sql_ms")
+BUDGET_HEADROOM = 3
+BUDGET_MIN_MS = 25
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    },
+}
+
+
+def get_time_scale():
+    """Множитель бюджетов времени из окружения."""
+    try:
+        return float(os.getenv("BENCHMARK_TIME_SCALE", 1))
+    except ValueError:
+        raise CommandError("BENCHMARK_TIME_SCALE должен быть числом")
+
+
+class Command(BaseCommand):
+    """Команда для замеров API на наборах данных разного объема."""
+
+    help = (
+        "Наполняет тестовую базу данными нескольких объемов и замеряет "
+        "время, число и время SQL-запросов ключевых эндпоинтов"
+    )
+
+    def add_arguments(self, parser):
+        """Добавляет опции объемов, повторов, бюджетов и вывода."""
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            choices=tuple(DATASETS),
+            default=("small", "medium"),
+            help="Объемы данных в порядке возрастания",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Количество повторов каждого запроса",
+        )
+        parser.add_argument(
+            "--budgets",
+            default=str(settings.BASE_DIR / "benchmark_budgets.json"),
+            help="Файл с бюджетами эндпоинтов",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark.json",
+            help="Файл для результатов в формате JSON",
+        )
+        parser.add_argument(
+            "--record-budgets",
+            action="store_true",
+            help="Записать текущие результаты с запасом как новые бюджеты",
+        )
+        parser.add_argument(
+            "--time-scale",
+            type=float,
+            default=get_time_scale(),
+            help=(
+                "Множитель бюджетов времени для медленных машин, "
+                "по умолчанию из BENCHMARK_TIME_SCALE"
+            ),
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Не пересоздавать тестовую базу",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Количество процессов генерации данных",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        budgets = self._load_budgets(options["budgets"])
+        report = {
+            "commit": self._get_commit(),
+            "created": timezone.now().isoformat(),
+            "repeat": options["repeat"],
+            "sizes": {},
+        }
+
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options["keepdb"],
+        )
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                if not Ingredient.objects.exists():
+                    call_command("load_db", stdout=self.stdout)
+                for size in options["sizes"]:
+                    self._grow_dataset(DATASETS[size], options["workers"])
+                    report["sizes"][size] = self._run_scenarios(
+                        options["repeat"],
+                    )
+        finally:
+            teardown_databases(
+                old_config, verbosity=0, keepdb=options["keepdb"],
+            )
+            teardown_test_environment()
+
+        failures = self._check_budgets(
+            report, budgets, options["time_scale"],
+        )
+        report["failures"] = failures
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write("Результаты записаны в %s" % options["output"])
+
+        if options["record_budgets"]:
+            self._record_budgets(report, budgets, options["budgets"])
+        elif failures:
+            raise CommandError(
+                "Превышены бюджеты:\n%s" % "\n".join(failures)
+            )
+
+    def _grow_dataset(self, target, workers):
+        """Догенерирует данные до нужного объема."""
+        missing = {
+            "users": target["users"] - User.objects.count(),
+            "recipes": target["recipes"] - Recipe.objects.count(),
+        }
+        if missing["users"] < 2 or missing["recipes"] < 1:
+            return
+        share = missing["users"] / target["users"]
+        call_command(
+            "generate_fixtures",
+            users=missing["users"],
+            recipes=missing["recipes"],
+            favorites=round(target["favorites"] * share),
+            carts=round(target["carts"] * share),
+            follows=round(target["follows"] * share),
+            workers=workers,
+            stdout=self.stdout,
+        )
+
+    def _scenarios(self):
+        """Запросы для замера: имя, пользователь, путь и параметры."""
+        cart_owner = User.objects.annotate(
+            carts=Count("shoppingcarts"),
+        ).order_by("-carts").first()
+        follower = User.objects.annotate(
+            follows=Count("following"),
+        ).order_by("-follows").first()
+        recipe = Recipe.objects.order_by("-pk").first()
+        search = recipe.name.split()[0]
+
+        return (
+            ("recipes-list", cart_owner, "/api/recipes/", {"limit": 6}),
+            ("recipes-list-deep-page", cart_owner, "/api/recipes/",
+             {"limit": 6, "page": 100}),
+            ("recipes-list-cursor", cart_owner, "/api/recipes/",
+             {"limit": 6, "cursor": ""}),
+            ("recipes-search", cart_owner, "/api/recipes/",
+             {"search": search}),
+            ("recipe-detail", cart_owner, "/api/recipes/%d/" % recipe.pk, {}),
+            ("shopping-cart-download", cart_owner,
+             "/api/recipes/download_shopping_cart/", {"format": "txt"}),
+            ("subscriptions", follower, "/api/users/subscriptions/",
+             {"recipes_limit": 3}),
+            ("ingredients-search", None, "/api/ingredients/", {"name": "са"}),
+            ("tags", None, "/api/tags/", {}),
+        )
+
+    def _run_scenarios(self, repeat):
+        """Замеряет все запросы на текущем наборе данных."""
+        results = {
+            "dataset": {
+                "users": User.objects.count(),
+                "recipes": Recipe.objects.count(),
+            },
+            "endpoints": {},
+        }
+        client = APIClient()
+        for name, user, path, params in self._scenarios():
+            client.force_authenticate(user)
+            cache.clear()
+            runs = [self._measure(client, path, params) for _ in range(repeat)]
+            cold, warm = runs[0], runs[1:] or runs
+            results["endpoints"][name] = {
+                "status": cold["status"],
+                "cold": cold,
+                "queries": max(run["queries"] for run in warm),
+                "wall_ms": round(
+                    statistics.median(run["wall_ms"] for run in warm), 2,
+                ),
+                "sql_ms": round(
+                    statistics.median(run["sql_ms"] for run in warm), 2,
+                ),
+            }
+            self.stdout.write("%-24s %s" % (
+                name, json.dumps(results["endpoints"][name]["cold"]),
+            ))
+        return results
+
+    def _measure(self, client, path, params):
+        """Выполняет запрос и возвращает время и статистику SQL."""
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(path, params)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            wall_ms = (time.perf_counter() - started) * 1000
+        return {
+            "status": response.status_code,
+            "queries": len(queries),
+            "wall_ms": round(wall_ms, 2),
+            "sql_ms": round(
+                sum(float(query["time"]) for query in queries) * 1000, 2,
+            ),
+        }
+
+    def _load_budgets(self, path):
+        """Читает бюджеты эндпоинтов."""
+        try:
+            with open(path, encoding="utf-8") as budgets_file:
+                return json.load(budgets_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            raise CommandError("Некорректный файл бюджетов %s: %s" % (path, e))
+
+    def _check_budgets(self, report, budgets, time_scale=1):
+        """Сравнивает результаты с бюджетами, время — с учетом множителя."""
+        failures = []
+        for size, results in report["sizes"].items():
+            for name, result in results["endpoints"].items():
+                if result["status"] >= 400:
+                    failures.append(
+                        "%s %s: статус %d" % (size, name, result["status"])
+                    )
+                limits = budgets.get(size, {}).get(name, {})
+                for metric in BUDGET_METRICS:
+                    if metric not in limits:
+                        continue
+                    limit = limits[metric]
+                    if metric != "queries":
+                        limit = round(limit * time_scale, 1)
+                    if result[metric] > limit:
+                        failures.append("%s %s: %s %s > %s" % (
+                            size, name, metric, result[metric], limit,
+                        ))
+        return failures
+
+    def _record_budgets(self, report, budgets, path):
+        """Сохраняет результаты с запасом как бюджеты."""
+        for size, results in report["sizes"].items():
+            for name, result in results["endpoints"].items():
+                budget = {"queries": result["queries"]}
+                for metric in ("wall_ms", "sql_ms"):
+                    budget[metric] = round(max(
+                        result[metric] * BUDGET_HEADROOM, BUDGET_MIN_MS,
+                    ), 1)
+                budgets.setdefault(size, {})[name] = budget
+        with open(path, "w", encoding="utf-8") as budgets_file:
+            json.dump(budgets, budgets_file, ensure_ascii=False, indent=2)
+            budgets_file.write("\n")
+        self.stdout.write("Бюджеты записаны в %s" % path)
+
+    def _get_commit(self):
+        """Возвращает текущий коммит, если он доступен."""
+        try:
+            return subprocess.run(
+                ("git", "rev-parse", "HEAD"),
+                capture_output=True, check=True, text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
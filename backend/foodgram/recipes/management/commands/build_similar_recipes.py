@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.constants import (
+    SIMILAR_BLOCK_SIZE, SIMILAR_MAX_POSTINGS, SIMILAR_RECIPES_COUNT,)
+from recipes.models import Recipe, SimilarRecipe
+
+
+class Command(BaseCommand):
+    """Команда для пересчета похожих рецептов, запускается по ночам."""
+
+    help = (
+        "Пересчитывает похожие рецепты для рецептов, состав которых "
+        "изменился после прошлого запуска, и для их соседей"
+    )
+
+    def add_arguments(self, parser):
+        """Добавляет опции полного пересчета и размера пачки."""
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать все рецепты",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=SIMILAR_BLOCK_SIZE,
+            help="Количество рецептов в одной пачке",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        self.started = timezone.now()
+        self.block_size = options["block_size"]
+        self.common = SimilarRecipe.objects.common_ingredients(
+            SIMILAR_MAX_POSTINGS,
+        )
+
+        if options["full"]:
+            recipes, created = self._rebuild_all()
+        else:
+            recipes, created = self._rebuild_outdated()
+        self.stdout.write(self.style.SUCCESS(
+            "Пересчитано рецептов: %d, похожих: %d" % (recipes, created)
+        ))
+
+    def _rebuild_all(self):
+        """Пересчитывает все рецепты пачками по возрастанию id."""
+        ids = Recipe.objects.order_by("pk").values_list("pk", flat=True)
+        recipes = created = 0
+        last_id = 0
+        while True:
+            block = list(ids.filter(pk__gt=last_id)[:self.block_size])
+            if not block:
+                return recipes, created
+            created += self._rebuild(block)
+            recipes += len(block)
+            last_id = block[-1]
+
+    def _rebuild_outdated(self):
+        """Пересчитывает измененные рецепты и рецепты рядом с ними.
+
+        Сходство симметрично, поэтому после изменения рецепта пересчитываются
+        и те, в чьих списках он был, и те, что попали в его новый список.
+        Рецепты, которым он стал похож, но не попали в его список, будут
+        учтены полным пересчетом.
+        """
+        changed = list(
+            SimilarRecipe.objects.outdated_recipes()
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        neighbours = set()
+        created = 0
+        for block in self._blocks(changed):
+            neighbours.update(
+                SimilarRecipe.objects.filter(similar_id__in=block)
+                .values_list("recipe_id", flat=True)
+            )
+            created += self._rebuild(block)
+            neighbours.update(
+                SimilarRecipe.objects.filter(recipe_id__in=block)
+                .values_list("similar_id", flat=True)
+            )
+
+        neighbours.difference_update(changed)
+        for block in self._blocks(sorted(neighbours)):
+            created += self._rebuild(block)
+        return len(changed) + len(neighbours), created
+
+    def _blocks(self, ids):
+        """Делит список id на пачки."""
+        for start in range(0, len(ids), self.block_size):
+            yield ids[start:start + self.block_size]
+
+    def _rebuild(self, block):
+        """Пересчитывает одну пачку рецептов."""
+        return SimilarRecipe.objects.rebuild(
+            block, self.common, SIMILAR_RECIPES_COUNT, self.started,
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from api.helpers import ShortLink
+from recipes.constants import BATCH_SIZE
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для заполнения коротких ссылок рецептов."""
+
+    help = "Заполняет короткие ссылки рецептов, у которых их нет"
+
+    def add_arguments(self, parser):
+        """Добавляет опцию размера пачки."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество рецептов в одном обновлении",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        queryset = Recipe.objects.filter(
+            short_link__isnull=True,
+        ).order_by("pk")
+
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk)
+                .values_list("pk", flat=True)[:options["batch_size"]]
+            )
+            if not batch:
+                break
+
+            updated += Recipe.objects.bulk_update(
+                [
+                    Recipe(pk=pk, short_link=ShortLink.encode(pk))
+                    for pk in batch
+                ],
+                ("short_link",),
+            )
+            last_pk = batch[-1]
+            self.stdout.write("Заполнено ссылок: %d" % updated)
+
+        self.stdout.write(
+            self.style.SUCCESS("Короткие ссылки заполнены: %d" % updated)
+        )
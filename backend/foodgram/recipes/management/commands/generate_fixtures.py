@@ -0,0 +1,388 @@
+import csv
+import io
+import random
+import time
+from bisect import bisect
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from multiprocessing import Pool
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+
+from api.caches import bump_version, recipe_fragments
+from api.etags import TAGS_VERSION_KEY
+from api.helpers import ShortLink
+from recipes.constants import FIXTURE_CHUNK_SIZE
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag,)
+from users.models import Follow, User
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DEGREE_ALPHA = 2.0
+FIRST_NAMES = ("Анна", "Иван", "Мария", "Олег", "Ольга", "Петр", "Вера")
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов")
+WORDS = (
+    "нарезать", "смешать", "обжарить", "запечь", "посолить", "добавить",
+    "перемешать", "остудить", "подавать", "варить", "тушить", "взбить",
+)
+
+_context = {}
+
+
+def _init_worker(context):
+    """Готовит процесс: Django, параметры и веса популярности."""
+    django.setup()
+    _context.update(context)
+    _context["user_weights"] = _zipf_weights(
+        context["users"][1] - context["users"][0], context["skew"],
+    )
+    _context["recipe_weights"] = _zipf_weights(
+        context["recipes"][1] - context["recipes"][0], context["skew"],
+    )
+
+
+def _zipf_weights(count, skew):
+    """Накопленные веса степенного распределения популярности."""
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _degree(rng, mean, limit):
+    """Число связей объекта с тяжелым хвостом и заданным средним."""
+    if mean <= 0:
+        return 0
+    scale = mean * (DEGREE_ALPHA - 1) / DEGREE_ALPHA
+    return min(round(rng.paretovariate(DEGREE_ALPHA) * scale), limit)
+
+
+def _sample(rng, weights, first_id, count, exclude=None):
+    """Выбирает различные id с вероятностью по популярности."""
+    total = weights[-1]
+    picked = set()
+    for _ in range(count * 20):
+        if len(picked) >= count:
+            break
+        pk = first_id + bisect(weights, rng.random() * total)
+        if pk != exclude:
+            picked.add(pk)
+    return sorted(picked)
+
+
+def _copy(model, columns, rows):
+    """Записывает строки в таблицу модели через COPY."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            "COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (
+                connection.ops.quote_name(model._meta.db_table),
+                ", ".join(columns),
+            ),
+            buffer,
+        )
+    return len(rows)
+
+
+def _users(rng, start, stop):
+    rows = [
+        (
+            pk, "f", "f", "t",
+            (EPOCH + timedelta(minutes=pk)).isoformat(),
+            "fixture_%d" % pk, "fixture_%d@example.com" % pk,
+            _context["password"],
+            rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), "{}",
+        )
+        for pk in range(start, stop)
+    ]
+    return _copy(User, (
+        "id", "is_superuser", "is_staff", "is_active", "date_joined",
+        "username", "email", "password", "first_name", "last_name",
+        "avatar_variants",
+    ), rows)
+
+
+def _recipes(rng, start, stop):
+    ingredients = _context["ingredient_names"]
+    first_user = _context["users"][0]
+    rows = []
+    for pk in range(start, stop):
+        main, side = rng.sample(ingredients, 2)
+        pub_date = (
+            EPOCH + timedelta(minutes=pk, seconds=rng.randint(0, 59))
+        ).isoformat()
+        rows.append((
+            pk,
+            _sample(rng, _context["user_weights"], first_user, 1)[0],
+            ("%s с %s" % (main, side))[:128].capitalize(),
+            " ".join(rng.choices(WORDS, k=rng.randint(10, 40))),
+            "images/fixture.jpg",
+            "{}",
+            rng.randint(5, 180),
+            pub_date,
+            pub_date,
+            ShortLink.encode(pk),
+        ))
+    written = _copy(Recipe, (
+        "id", "author_id", "name", "text", "image", "image_variants",
+        "cooking_time", "pub_date", "ingredients_updated_at", "short_link",
+    ), rows)
+    Recipe.objects.filter(pk__gte=start, pk__lt=stop).update_search_vector()
+    return written
+
+
+def _recipe_ingredients(rng, start, stop):
+    ingredient_ids = _context["ingredient_ids"]
+    low, high = _context["ingredients_per_recipe"]
+    rows = [
+        (pk, ingredient_id, rng.randint(1, 500))
+        for pk in range(start, stop)
+        for ingredient_id in rng.sample(
+            ingredient_ids, min(rng.randint(low, high), len(ingredient_ids)),
+        )
+    ]
+    return _copy(
+        RecipeIngredient, ("recipe_id", "ingredient_id", "amount"), rows,
+    )
+
+
+def _recipe_tags(rng, start, stop):
+    tag_ids = _context["tag_ids"]
+    rows = [
+        (pk, tag_id)
+        for pk in range(start, stop)
+        for tag_id in rng.sample(tag_ids, rng.randint(1, min(3, len(tag_ids))))
+    ]
+    return _copy(Recipe.tags.through, ("recipe_id", "tag_id"), rows)
+
+
+def _user_recipes(model, mean_key):
+    def generate(rng, start, stop):
+        first_recipe, last_recipe = _context["recipes"]
+        weights = _context["recipe_weights"]
+        rows = []
+        for pk in range(start, stop):
+            count = _degree(
+                rng, _context[mean_key], (last_recipe - first_recipe) // 2,
+            )
+            added = EPOCH + timedelta(minutes=pk)
+            for recipe_id in _sample(rng, weights, first_recipe, count):
+                rows.append((pk, recipe_id, added.isoformat()))
+        return _copy(model, ("user_id", "recipe_id", "pub_date"), rows)
+    return generate
+
+
+def _follows(rng, start, stop):
+    first_user, last_user = _context["users"]
+    weights = _context["user_weights"]
+    rows = []
+    for pk in range(start, stop):
+        count = _degree(
+            rng, _context["follows_mean"], (last_user - first_user) // 2,
+        )
+        rows.extend(
+            (pk, following_id)
+            for following_id in _sample(
+                rng, weights, first_user, count, exclude=pk,
+            )
+        )
+    return _copy(Follow, ("user_id", "following_id"), rows)
+
+
+GENERATORS = {
+    "users": _users,
+    "recipes": _recipes,
+    "recipe_ingredients": _recipe_ingredients,
+    "recipe_tags": _recipe_tags,
+    "favorites": _user_recipes(Favorite, "favorites_mean"),
+    "shopping_carts": _user_recipes(ShoppingCart, "carts_mean"),
+    "follows": _follows,
+}
+
+
+def _generate(job):
+    """Генерирует и записывает одну пачку; зависит только от seed и id."""
+    kind, start, stop = job
+    rng = random.Random("%s:%s:%s" % (_context["seed"], kind, start))
+    return kind, GENERATORS[kind](rng, start, stop)
+
+
+class Command(BaseCommand):
+    """Команда для генерации больших наборов тестовых данных."""
+
+    help = "Создает пользователей, рецепты и связи между ними для нагрузки"
+
+    def add_arguments(self, parser):
+        """Добавляет опции объема, распределений и параллельности."""
+        parser.add_argument(
+            "--users", type=int, default=1000,
+            help="Количество пользователей",
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=5000,
+            help="Количество рецептов",
+        )
+        parser.add_argument(
+            "--tags", type=int, default=10,
+            help="Минимальный размер справочника тегов",
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe", type=int, nargs=2, default=(3, 12),
+            metavar=("MIN", "MAX"),
+            help="Диапазон числа ингредиентов в рецепте",
+        )
+        parser.add_argument(
+            "--favorites", type=int, default=20000,
+            help="Примерное общее число рецептов в избранном",
+        )
+        parser.add_argument(
+            "--carts", type=int, default=5000,
+            help="Примерное общее число рецептов в корзинах",
+        )
+        parser.add_argument(
+            "--follows", type=int, default=20000,
+            help="Примерное общее число подписок",
+        )
+        parser.add_argument(
+            "--skew", type=float, default=1.1,
+            help="Показатель степенного распределения популярности",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Зерно генератора, одинаковое зерно дает одинаковые данные",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Количество процессов, по умолчанию по числу CPU",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=FIXTURE_CHUNK_SIZE,
+            help="Количество пользователей или рецептов в одной пачке",
+        )
+        parser.add_argument(
+            "--password", default="fixture-password",
+            help="Пароль всех созданных пользователей",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        if options["users"] < 2 or options["recipes"] < 1:
+            raise CommandError("Нужно хотя бы 2 пользователя и 1 рецепт")
+        ingredients = list(Ingredient.objects.values_list("id", "name"))
+        if len(ingredients) < 2:
+            raise CommandError("Сначала загрузите ингредиенты: load_db")
+
+        tag_ids = self._ensure_tags(options["tags"])
+        first_user = (User.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+        first_recipe = (Recipe.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+        users = (first_user, first_user + options["users"])
+        recipes = (first_recipe, first_recipe + options["recipes"])
+        low, high = options["ingredients_per_recipe"]
+
+        context = {
+            "seed": options["seed"],
+            "skew": options["skew"],
+            "users": users,
+            "recipes": recipes,
+            "tag_ids": tag_ids,
+            "ingredient_ids": [pk for pk, _ in ingredients],
+            "ingredient_names": [name for _, name in ingredients],
+            "ingredients_per_recipe": (max(low, 1), max(high, low, 1)),
+            "favorites_mean": options["favorites"] / options["users"],
+            "carts_mean": options["carts"] / options["users"],
+            "follows_mean": options["follows"] / options["users"],
+            "password": make_password(options["password"]),
+        }
+        chunk = options["chunk_size"]
+        by_user = [
+            (start, min(start + chunk, users[1]))
+            for start in range(*users, chunk)
+        ]
+        by_recipe = [
+            (start, min(start + chunk, recipes[1]))
+            for start in range(*recipes, chunk)
+        ]
+
+        # Дочерние процессы открывают собственные соединения с базой.
+        connections.close_all()
+        started = time.monotonic()
+        with Pool(options["workers"], _init_worker, (context,)) as pool:
+            self._run_phase(pool, [("users", *job) for job in by_user])
+            self._run_phase(pool, [("recipes", *job) for job in by_recipe])
+            self._run_phase(pool, [
+                (kind, *job)
+                for kind in ("recipe_ingredients", "recipe_tags")
+                for job in by_recipe
+            ] + [
+                (kind, *job)
+                for kind in ("favorites", "shopping_carts", "follows")
+                for job in by_user
+            ])
+
+        self._finish(users)
+        self.stdout.write(self.style.SUCCESS(
+            "Данные созданы за %.1f с: пользователи %d-%d, рецепты %d-%d"
+            % (time.monotonic() - started, users[0], users[1] - 1,
+               recipes[0], recipes[1] - 1)
+        ))
+
+    def _ensure_tags(self, count):
+        """Дополняет справочник тегов до нужного количества."""
+        Tag.objects.bulk_create(
+            [
+                Tag(name="Тег %d" % number, slug="tag-%d" % number)
+                for number in range(1, count + 1)
+            ],
+            ignore_conflicts=True,
+        )
+        bump_version(TAGS_VERSION_KEY)
+        recipe_fragments.bump_catalog()
+        return list(Tag.objects.values_list("pk", flat=True))
+
+    def _run_phase(self, pool, jobs):
+        """Выполняет пачки параллельно и выводит прогресс."""
+        started = time.monotonic()
+        totals = {}
+        for done, (kind, written) in enumerate(
+            pool.imap_unordered(_generate, jobs), 1,
+        ):
+            totals[kind] = totals.get(kind, 0) + written
+            if done % 10 == 0 or done == len(jobs):
+                elapsed = time.monotonic() - started
+                self.stdout.write("%d/%d пачек, %d строк/с: %s" % (
+                    done, len(jobs),
+                    sum(totals.values()) / elapsed if elapsed else 0,
+                    ", ".join(
+                        "%s=%d" % item for item in sorted(totals.items())
+                    ),
+                ))
+
+    def _finish(self, users):
+        """Сдвигает последовательности и считает списки покупок."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Recipe],
+            ):
+                cursor.execute(sql)
+
+        # Списки покупок новых пользователей собираются одним запросом,
+        # это быстрее построчного пересчета для миллионов корзин.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO {items} (user_id, ingredient_id, total_amount) "
+                "SELECT cart.user_id, ri.ingredient_id, SUM(ri.amount) "
+                "FROM {carts} cart JOIN {recipe_ingredients} ri "
+                "ON ri.recipe_id = cart.recipe_id "
+                "WHERE cart.user_id >= %s AND cart.user_id < %s "
+                "GROUP BY cart.user_id, ri.ingredient_id".format(
+                    items=ShoppingListItem._meta.db_table,
+                    carts=ShoppingCart._meta.db_table,
+                    recipe_ingredients=RecipeIngredient._meta.db_table,
+                ),
+                users,
+            )
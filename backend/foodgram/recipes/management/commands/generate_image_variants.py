@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.images import IMAGE_FIELDS, update_variants, variants_outdated
+
+
+class Command(BaseCommand):
+    """Команда для генерации уменьшенных копий загруженных изображений."""
+
+    help = "Создает уменьшенные копии картинок рецептов и аватарок"
+
+    def add_arguments(self, parser):
+        """Добавляет опции числа процессов и полного пересчета."""
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Количество процессов для обработки изображений",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересчитать копии даже для актуальных изображений",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        jobs = []
+        for model_label, fields in IMAGE_FIELDS.items():
+            image_field, variants_field, _ = fields
+            queryset = apps.get_model(model_label).objects.only(
+                image_field, variants_field,
+            ).order_by("pk")
+            jobs.extend(
+                (model_label, instance.pk)
+                for instance in queryset.iterator()
+                if options["all"] or variants_outdated(instance)
+            )
+
+        # Дочерние процессы открывают собственные соединения с базой.
+        connections.close_all()
+
+        failed = 0
+        with ProcessPoolExecutor(
+            max_workers=options["workers"], initializer=django.setup,
+        ) as executor:
+            futures = {
+                executor.submit(update_variants, *job): job for job in jobs
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write("%s %s: %s" % (*futures[future], error))
+                self.stdout.write("Обработано: %d/%d" % (done, len(jobs)))
+
+        self.stdout.write(self.style.SUCCESS(
+            "Копии изображений созданы: %d, ошибок: %d"
+            % (len(jobs) - failed, failed)
+        ))
@@ -1,38 +1,86 @@
+import csv
+import io
+import json
 import os
-from csv import reader
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
 
+from api.caches import bump_version, ingredient_index, recipe_fragments
+from api.etags import TAGS_VERSION_KEY
+from recipes.constants import BATCH_SIZE
 from recipes.models import Ingredient, Tag
 
 
+def iter_json_array(json_file, read_size):
+    """Разбирает JSON-массив по одному элементу, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = json_file.read(read_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("ожидается JSON-массив объектов")
+    buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = json_file.read(read_size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
 class Command(BaseCommand):
-    """Команда для загрузки ингредиентов и тегов из CSV файлов в базу данных"""
+    """Команда для загрузки ингредиентов и тегов из CSV и JSON в базу."""
 
-    help = "Загружает начальные данные из CSV файлов в базу данных"
+    help = "Загружает начальные данные из CSV или JSON файлов в базу данных"
 
+    READ_SIZE = 64 * 1024
     DATA_CONFIG = {
         Ingredient: {
+            "option": "ingredients",
             "file": "ingredients.csv",
-            "fields": {0: "name", 1: "measurement_unit"},
+            "fields": ("name", "measurement_unit"),
+            "conflict": ("name", "measurement_unit"),
             "has_header": False,
         },
         Tag: {
+            "option": "tags",
             "file": "tags.csv",
-            "fields": {0: "name", 1: "slug"},
+            "fields": ("name", "slug"),
+            "conflict": (),
             "has_header": False,
         }
     }
 
     def add_arguments(self, parser):
-        """Добавляет опции для перезаписи существующих данных."""
+        """Добавляет опции источников, размера пачки и перезаписи."""
         parser.add_argument(
             "--force",
             action="store_true",
             help="Полная очистка таблиц перед загрузкой данных"
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество строк в одной пачке COPY",
+        )
+        for config in self.DATA_CONFIG.values():
+            parser.add_argument(
+                "--%s" % config["option"],
+                metavar="PATH",
+                help="Файл .csv, .json или .jsonl (по умолчанию data/%s)"
+                % config["file"],
+            )
 
     def _get_file_path(self, filename):
         """Возвращает абсолютный путь к файлу данных."""
@@ -45,54 +93,168 @@ class Command(BaseCommand):
         if not os.path.isfile(file_path):
             raise IsADirectoryError("%s является директорией" % file_path)
 
-    def _load_model_data(self, model, config):
+    def _read_rows(self, data_file, file_path, config):
+        """Построчно читает значения полей из CSV, JSON или JSON Lines."""
+        fields = config["fields"]
+        extension = os.path.splitext(file_path)[1].lower()
+
+        if extension == ".csv":
+            csv_reader = csv.reader(data_file)
+            if config["has_header"]:
+                next(csv_reader, None)
+            for row in csv_reader:
+                if not row:
+                    continue
+                if len(row) < len(fields):
+                    raise ValueError(
+                        "строка %d: ожидается %d значения"
+                        % (csv_reader.line_num, len(fields))
+                    )
+                yield [value.strip() for value in row[:len(fields)]]
+            return
+
+        if extension == ".json":
+            position = "элемент %d"
+            items = enumerate(iter_json_array(data_file, self.READ_SIZE), 1)
+        elif extension == ".jsonl":
+            position = "строка %d"
+            items = (
+                (number, json.loads(line))
+                for number, line in enumerate(data_file, 1)
+                if line.strip()
+            )
+        else:
+            raise ValueError("неизвестный формат файла %s" % extension)
+        for number, item in items:
+            if not isinstance(item, dict):
+                raise ValueError(
+                    "%s: ожидается объект" % (position % number)
+                )
+            missing = [field for field in fields if field not in item]
+            if missing:
+                raise ValueError("%s: в объекте нет полей %s" % (
+                    position % number, missing,
+                ))
+            yield [str(item[field]).strip() for field in fields]
+
+    def _copy_batch(self, cursor, model, config, staging, rows):
+        """Загружает пачку через COPY и переносит новые строки в таблицу."""
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(field) for field in config["fields"])
+        conflict = ""
+        if config["conflict"]:
+            conflict = "(%s)" % ", ".join(
+                quote(field) for field in config["conflict"]
+            )
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            "COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (staging, columns),
+            buffer,
+        )
+        cursor.execute(
+            "INSERT INTO %s (%s) SELECT %s FROM %s "
+            "ON CONFLICT %s DO NOTHING" % (
+                quote(model._meta.db_table), columns, columns, staging,
+                conflict,
+            )
+        )
+        inserted = cursor.rowcount
+        cursor.execute("TRUNCATE %s" % staging)
+        return inserted
+
+    def _load_model_data(self, model, config, file_path, batch_size):
         """Загружает данные для конкретной модели."""
-        file_path = self._get_file_path(config["file"])
         self.stdout.write(
             "Загрузка данных для %s из %s..." % (model.__name__, file_path)
         )
+        self._validate_file(file_path)
 
-        try:
-            self._validate_file(file_path)
-
-            with open(file_path, "r", encoding="utf-8") as csv_file:
-                csv_reader = reader(csv_file)
+        staging = connection.ops.quote_name(
+            "load_%s" % model._meta.db_table
+        )
+        started = time.monotonic()
+        read = inserted = 0
+        with open(file_path, "r", encoding="utf-8") as data_file, \
+                connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE %s (%s) ON COMMIT DROP" % (
+                    staging,
+                    ", ".join(
+                        "%s text" % connection.ops.quote_name(field)
+                        for field in config["fields"]
+                    ),
+                )
+            )
 
-                if config["has_header"]:
-                    next(csv_reader)
+            batch = []
+            rows = self._read_rows(data_file, file_path, config)
+            for row in rows:
+                batch.append(row)
+                if len(batch) < batch_size:
+                    continue
+                read += len(batch)
+                inserted += self._copy_batch(
+                    cursor, model, config, staging, batch,
+                )
+                batch = []
+                self._report(model, read, inserted, started)
+            if batch:
+                read += len(batch)
+                inserted += self._copy_batch(
+                    cursor, model, config, staging, batch,
+                )
 
-                objects = [
-                    model(**{
-                        model_field: row[col_index].strip()
-                        for col_index, model_field in config["fields"].items()
-                    })
-                    for row in csv_reader
-                ]
+            cursor.execute("DROP TABLE %s" % staging)
 
-                model.objects.bulk_create(objects)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        "Успешно загружено %d записей для %s" %
-                        (
-                            len(objects), model.__name__
-                        )
-                    )
-                )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            "Загружено %d новых записей для %s из %d строк "
+            "за %.2f с (%d строк/с)" % (
+                inserted, model.__name__, read, elapsed,
+                read / elapsed if elapsed else read,
+            )
+        ))
+        return inserted
 
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(
-                "Ошибка при загрузке %s: %s" % (model.__name__, str(e))
-            ))
+    def _report(self, model, read, inserted, started):
+        """Выводит прогресс загрузки."""
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            "%s: прочитано %d, добавлено %d, %d строк/с" % (
+                model.__name__, read, inserted,
+                read / elapsed if elapsed else read,
+            )
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         """Основная логика выполнения команды."""
-        if options["force"]:
-            for model in self.DATA_CONFIG:
-                model.objects.all().delete()
-            self.stdout.write(
-                self.style.WARNING("Все существующие данные удалены")
-            )
+        inserted = 0
+        with transaction.atomic():
+            if options["force"]:
+                for model in self.DATA_CONFIG:
+                    model.objects.all().delete()
+                self.stdout.write(
+                    self.style.WARNING("Все существующие данные удалены")
+                )
+
+            for model, config in self.DATA_CONFIG.items():
+                file_path = (
+                    options[config["option"]]
+                    or self._get_file_path(config["file"])
+                )
+                try:
+                    inserted += self._load_model_data(
+                        model, config, file_path, options["batch_size"],
+                    )
+                except (OSError, ValueError, DatabaseError) as e:
+                    raise CommandError(
+                        "Ошибка при загрузке %s: %s" % (model.__name__, e)
+                    ) from e
 
-        for model, config in self.DATA_CONFIG.items():
-            self._load_model_data(model, config)
+        if inserted or options["force"]:
+            ingredient_index.invalidate()
+            recipe_fragments.bump_catalog()
+            bump_version(TAGS_VERSION_KEY)
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.tasks import sync_feed
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Команда для заполнения лент подписок по текущим подпискам."""
+
+    help = "Заполняет ленты подписок последними рецептами авторов"
+
+    def add_arguments(self, parser):
+        """Добавляет опцию заполнения для отдельных пользователей."""
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Ник пользователя, можно указать несколько раз",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        follows = Follow.objects.all()
+        if options["usernames"]:
+            follows = follows.filter(user__username__in=options["usernames"])
+
+        authors = {}
+        for user_id, author_id in follows.values_list("user", "following"):
+            authors.setdefault(user_id, []).append(author_id)
+        for user_id, author_ids in authors.items():
+            sync_feed(user_id, author_ids)
+        self.stdout.write(
+            self.style.SUCCESS("Обновлено лент: %d" % len(authors))
+        )
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Команда для пересчета списков покупок по корзинам."""
+
+    help = "Пересчитывает суммы ингредиентов в списках покупок с нуля"
+
+    def add_arguments(self, parser):
+        """Добавляет опцию пересчета для отдельных пользователей."""
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Ник пользователя, можно указать несколько раз",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        users = None
+        if options["usernames"]:
+            users = User.objects.filter(username__in=options["usernames"])
+
+        created = ShoppingListItem.objects.refresh(users=users)
+        self.stdout.write(
+            self.style.SUCCESS("Позиций списков покупок: %d" % created)
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from recipes.constants import BATCH_SIZE
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для заполнения поисковых векторов рецептов."""
+
+    help = "Заполняет поисковые векторы рецептов пачками"
+
+    def add_arguments(self, parser):
+        """Добавляет опции размера пачки и полного пересчета."""
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Количество рецептов в одном обновлении",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересчитать векторы всех рецептов, а не только пустые",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        queryset = Recipe.objects.order_by("pk")
+        if not options["all"]:
+            queryset = queryset.filter(search_vector__isnull=True)
+
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk)
+                .values_list("pk", flat=True)[:options["batch_size"]]
+            )
+            if not batch:
+                break
+
+            updated += Recipe.objects.filter(
+                pk__in=batch,
+            ).update_search_vector()
+            last_pk = batch[-1]
+            self.stdout.write("Обновлено векторов: %d" % updated)
+
+        self.stdout.write(
+            self.style.SUCCESS("Поисковые векторы заполнены: %d" % updated)
+        )
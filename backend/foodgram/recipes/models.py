@@ -1,7 +1,12 @@
 """Модуль с моделями для приложения."""
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import (
+    Count, Exists, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, Window,)
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 
 from recipes.constants import (
@@ -9,7 +14,9 @@ from recipes.constants import (
     MIN_COOKING_TIME, MIN_SUM_INGREDIENT,
     MAX_LINK_LENGTH, MAX_LENGTH_OF_TAGS,
     MAX_LENGTH_OF_RECIPE_NAME, MAX_LENGTH_OF_RECIPE_UNIT,
+    SEARCH_CONFIG, SHOPPING_LIST_CHUNK_SIZE, FEED_FANOUT_LIMIT,
 )
+from users.models import Follow
 
 User = get_user_model()
 
@@ -64,6 +71,70 @@ class Ingredient(models.Model):
         return self.name[:MAX_VIEW_LENGTH]
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов с данными для отображения."""
+
+    def with_user_flags(self, user):
+        """Добавляет флаги избранного, корзины и подписки на автора."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk")),
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk")),
+            ),
+            is_author_subscribed=Exists(
+                Follow.objects.filter(
+                    user=user, following=OuterRef("author"),
+                ),
+            ),
+        )
+
+    @staticmethod
+    def related_lookups():
+        """Связи рецепта, нужные для его отображения."""
+        return (
+            "author",
+            "tags",
+            Prefetch(
+                "recipe_ingredients",
+                queryset=RecipeIngredient.objects.select_related("ingredient"),
+            ),
+        )
+
+    def latest_by_author(self, authors, limit=None):
+        """Последние рецепты каждого автора одним запросом."""
+        queryset = self.filter(author__in=authors).annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F("author_id"),
+                order_by=(F("pub_date").desc(), F("id").desc()),
+            ),
+        )
+        if limit is not None:
+            queryset = queryset.filter(row_number__lte=limit)
+        return queryset.order_by("author_id", "row_number")
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор по названию и описанию."""
+        return self.update(
+            search_vector=(
+                SearchVector("name", weight="A", config=SEARCH_CONFIG)
+                + SearchVector("text", weight="B", config=SEARCH_CONFIG)
+            ),
+        )
+
+    def mark_ingredients_updated(self):
+        """Отмечает изменение состава для пересчета похожих рецептов."""
+        return self.update(ingredients_updated_at=timezone.now())
+
+
 class Recipe(models.Model):
     """Рецепт блюда."""
 
@@ -84,6 +155,11 @@ class Recipe(models.Model):
         verbose_name="Картинка блюда",
         upload_to="images",
     )
+    image_variants = models.JSONField(
+        verbose_name="Уменьшенные копии картинки",
+        default=dict,
+        editable=False,
+    )
     cooking_time = models.PositiveIntegerField(
         validators=(MinValueValidator(MIN_COOKING_TIME),),
         verbose_name="Время готовки",
@@ -93,6 +169,16 @@ class Recipe(models.Model):
         default=timezone.now,
         db_index=True,
     )
+    ingredients_updated_at = models.DateTimeField(
+        verbose_name="Дата изменения состава",
+        default=timezone.now,
+        editable=False,
+    )
+    similar_updated_at = models.DateTimeField(
+        verbose_name="Дата пересчета похожих рецептов",
+        null=True,
+        editable=False,
+    )
     ingredients = models.ManyToManyField(
         to=Ingredient,
         verbose_name="Ингредиенты",
@@ -109,13 +195,39 @@ class Recipe(models.Model):
         blank=True,
         null=True,
     )
+    search_vector = SearchVectorField(
+        verbose_name="Поисковый вектор",
+        editable=False,
+        null=True,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
 
         default_related_name = "recipes"
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
-        ordering = ("pub_date",)
+        ordering = ("pub_date", "id",)
+        indexes = [
+            models.Index(
+                fields=("pub_date", "id",),
+                name="recipe_pub_date_id_idx",
+            ),
+            models.Index(
+                fields=("author", "pub_date", "id",),
+                name="recipe_author_pub_date_idx",
+            ),
+            GinIndex(
+                fields=("search_vector",),
+                name="recipe_search_vector_idx",
+            ),
+            GinIndex(
+                fields=("name",),
+                name="recipe_name_trgm_idx",
+                opclasses=("gin_trgm_ops",),
+            ),
+        ]
 
     def __str__(self):
         return self.name[:MAX_VIEW_LENGTH]
@@ -229,3 +341,420 @@ class ShoppingCart(BaseFavoriteShoppingCart):
 
     def __str__(self):
         return f"{self.recipe} в корзине {self.user}"
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """Поддержка сумм ингредиентов в корзинах покупок.
+
+    Каждое изменение блокирует строки пользователей, чьи списки оно
+    меняет, поэтому изменения одного списка выполняются по очереди и
+    пересчет не сталкивается с добавлением рецепта.
+    """
+
+    @staticmethod
+    def lock_users(users):
+        """Блокирует строки пользователей до конца транзакции.
+
+        Строки блокируются по возрастанию id, чтобы параллельные
+        пересчеты нескольких списков не взаимоблокировались.
+        """
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in=users)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    def add_recipe(self, user, recipe):
+        """Прибавляет ингредиенты рецепта к списку покупок пользователя."""
+        self.lock_users([user.pk])
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (user_id, ingredient_id, total_amount)
+                SELECT %s, ingredient_id, amount
+                FROM {RecipeIngredient._meta.db_table}
+                WHERE recipe_id = %s
+                ON CONFLICT (user_id, ingredient_id) DO UPDATE
+                SET total_amount = {table}.total_amount
+                    + EXCLUDED.total_amount
+                """,
+                [user.pk, recipe.pk],
+            )
+
+    def remove_recipe(self, users, recipe):
+        """Вычитает ингредиенты рецепта из списков покупок пользователей."""
+        self.lock_users(users)
+        amount = RecipeIngredient.objects.filter(
+            recipe=recipe, ingredient=OuterRef("ingredient"),
+        ).values("amount")
+        items = self.filter(
+            user__in=users,
+            ingredient__in=RecipeIngredient.objects.filter(
+                recipe=recipe,
+            ).values("ingredient"),
+        )
+        items.update(total_amount=F("total_amount") - Subquery(amount))
+        self.filter(user__in=users, total_amount__lte=0).delete()
+
+    def remove_cart(self, cart):
+        """Вычитает рецепт удаляемой корзины из списка покупок.
+
+        Вызывается до удаления строки корзины, пока ингредиенты рецепта
+        еще на месте. После блокировки пользователя корзина проверяется
+        заново: параллельное удаление той же корзины могло успеть
+        вычесть рецепт.
+        """
+        self.lock_users([cart.user_id])
+        if ShoppingCart.objects.filter(pk=cart.pk).exists():
+            self.remove_recipe([cart.user_id], cart.recipe_id)
+
+    def refresh_recipes(self, user, recipes):
+        """Пересчитывает список покупок по ингредиентам рецептов."""
+        return self.refresh(
+            users=[user.pk],
+            ingredients=RecipeIngredient.objects.filter(
+                recipe__in=recipes,
+            ).values("ingredient"),
+        )
+
+    def refresh(self, users=None, ingredients=None):
+        """Пересчитывает суммы по корзинам заново.
+
+        Пересчет всех списков не блокирует пользователей, поэтому суммы
+        записываются с заменой строк, добавленных параллельно.
+        """
+        if users is not None:
+            self.lock_users(users)
+        stale = self.all()
+        # Условия на корзины задаются одним filter(): повторный вызов
+        # добавил бы второе соединение с корзинами и размножил строки.
+        conditions = {"recipe__shoppingcarts__isnull": False}
+        if users is not None:
+            stale = stale.filter(user__in=users)
+            conditions["recipe__shoppingcarts__user__in"] = users
+        if ingredients is not None:
+            stale = stale.filter(ingredient__in=ingredients)
+            conditions["ingredient__in"] = ingredients
+        totals = RecipeIngredient.objects.filter(**conditions)
+        stale.delete()
+
+        rows = (
+            totals.values_list("recipe__shoppingcarts__user", "ingredient")
+            .annotate(total_amount=Sum("amount"))
+            .order_by()
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        )
+        created = 0
+        batch = []
+        for user_id, ingredient_id, total_amount in rows:
+            batch.append(self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total_amount,
+            ))
+            if len(batch) >= SHOPPING_LIST_CHUNK_SIZE:
+                created += self._upsert(batch)
+                batch = []
+        if batch:
+            created += self._upsert(batch)
+        return created
+
+    def _upsert(self, items):
+        """Записывает суммы с заменой существующих строк."""
+        return len(self.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=("user", "ingredient"),
+            update_fields=("total_amount",),
+        ))
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента в корзине покупок пользователя.
+
+    Сохранение и удаление корзины, в том числе каскадное, меняют суммы
+    в той же транзакции через сигналы. Массовые вставки корзин сигналов
+    не отправляют, их суммы пересчитываются явно. После изменения
+    состава рецепта суммы владельцев его корзин пересчитывает фоновая
+    задача refresh_shopping_lists, поэтому до ее выполнения списки этих
+    пользователей отстают от корзин.
+    """
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        to=Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name="Ингредиент",
+    )
+    total_amount = models.BigIntegerField(
+        verbose_name="Общее количество",
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+
+        default_related_name = "shopping_list_items"
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Список покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=(
+                    "user",
+                    "ingredient",
+                ),
+                name="unique_user_shopping_list_ingredient",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient} — {self.total_amount} у {self.user}"
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    """Ленты рецептов авторов, на которых подписаны пользователи."""
+
+    @staticmethod
+    def is_fanned_out(author_id):
+        """Раскладываются ли рецепты автора по лентам подписчиков."""
+        return not Follow.objects.filter(
+            following_id=author_id,
+        ).values("pk")[FEED_FANOUT_LIMIT - 1:FEED_FANOUT_LIMIT].exists()
+
+    def fan_out(self, recipe, batch_size):
+        """Добавляет рецепт в ленты подписчиков автора пачками."""
+        followers = (
+            Follow.objects.filter(following_id=recipe.author_id)
+            .order_by("user_id")
+            .values_list("user_id", flat=True)
+        )
+        last_id = 0
+        while True:
+            user_ids = list(followers.filter(user_id__gt=last_id)[:batch_size])
+            if not user_ids:
+                return
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id,
+                        recipe_id=recipe.pk,
+                        author_id=recipe.author_id,
+                        pub_date=recipe.pub_date,
+                    )
+                    for user_id in user_ids
+                ],
+                ignore_conflicts=True,
+            )
+            last_id = user_ids[-1]
+
+    def backfill(self, user_id, author_id, limit):
+        """Добавляет в ленту последние рецепты автора."""
+        recipes = (
+            Recipe.objects.filter(author_id=author_id)
+            .order_by("-pub_date", "-id")
+            .values_list("id", "pub_date")[:limit]
+        )
+        return len(self.bulk_create(
+            [
+                self.model(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in recipes
+            ],
+            ignore_conflicts=True,
+        ))
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="Дата добавления рецепта",
+    )
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+
+        default_related_name = "feed_entries"
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Лента подписок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=(
+                    "user",
+                    "recipe",
+                ),
+                name="unique_user_feed_recipe",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=("user", "pub_date", "recipe",),
+                name="feed_user_pub_date_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} в ленте {self.user}"
+
+
+class SimilarRecipeQuerySet(models.QuerySet):
+    """Похожие рецепты по совпадению ингредиентов."""
+
+    @staticmethod
+    def outdated_recipes():
+        """Рецепты, состав которых менялся после пересчета похожих."""
+        return Recipe.objects.filter(
+            Q(similar_updated_at__isnull=True)
+            | Q(similar_updated_at__lt=F("ingredients_updated_at"))
+        )
+
+    @staticmethod
+    def common_ingredients(max_recipes):
+        """Ингредиенты, которые входят больше чем в max_recipes рецептов.
+
+        Такие ингредиенты, как соль или вода, почти ничего не говорят о
+        сходстве, а список их рецептов сделал бы пересчет квадратичным.
+        """
+        return list(
+            RecipeIngredient.objects.order_by()
+            .values("ingredient")
+            .annotate(recipes=Count("pk"))
+            .filter(recipes__gt=max_recipes)
+            .values_list("ingredient", flat=True)
+        )
+
+    def rebuild(self, recipe_ids, common_ingredient_ids, limit, started):
+        """Пересчитывает похожие рецепты для пачки рецептов.
+
+        Сходство — коэффициент Жаккара по наборам ингредиентов без
+        самых распространенных. Кандидаты находятся соединением состава
+        рецептов по ингредиенту, поэтому сравниваются только рецепты с
+        общими ингредиентами, а лучшие limit отбираются оконной функцией
+        на стороне базы.
+        """
+        table = self.model._meta.db_table
+        ingredients_table = RecipeIngredient._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.filter(recipe_id__in=recipe_ids).delete()
+            cursor.execute(
+                f"""
+                WITH pairs AS (
+                    SELECT source.recipe_id, other.recipe_id AS similar_id,
+                        COUNT(*) AS shared
+                    FROM {ingredients_table} source
+                    JOIN {ingredients_table} other
+                        ON other.ingredient_id = source.ingredient_id
+                        AND other.recipe_id <> source.recipe_id
+                    WHERE source.recipe_id = ANY(%(recipes)s)
+                        AND source.ingredient_id <> ALL(%(common)s::bigint[])
+                    GROUP BY source.recipe_id, other.recipe_id
+                ), sizes AS (
+                    SELECT recipe_id, COUNT(*) AS size
+                    FROM {ingredients_table}
+                    WHERE (
+                        recipe_id IN (SELECT similar_id FROM pairs)
+                        OR recipe_id = ANY(%(recipes)s)
+                    ) AND ingredient_id <> ALL(%(common)s::bigint[])
+                    GROUP BY recipe_id
+                ), scores AS (
+                    SELECT pairs.recipe_id, pairs.similar_id,
+                        pairs.shared::double precision
+                        / (source.size + other.size - pairs.shared) AS score
+                    FROM pairs
+                    JOIN sizes source ON source.recipe_id = pairs.recipe_id
+                    JOIN sizes other ON other.recipe_id = pairs.similar_id
+                )
+                INSERT INTO {table} (recipe_id, similar_id, score)
+                SELECT recipe_id, similar_id, score
+                FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY recipe_id
+                        ORDER BY score DESC, similar_id
+                    ) AS position
+                    FROM scores
+                ) ranked
+                WHERE position <= %(limit)s
+                """,
+                {
+                    "recipes": list(recipe_ids),
+                    "common": list(common_ingredient_ids),
+                    "limit": limit,
+                },
+            )
+            created = cursor.rowcount
+            Recipe.objects.filter(pk__in=recipe_ids).update(
+                similar_updated_at=started,
+            )
+        return created
+
+
+class SimilarRecipe(models.Model):
+    """Рецепт, похожий на данный по составу."""
+
+    recipe = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        related_name="similar_recipes",
+        verbose_name="Рецепт",
+    )
+    similar = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Похожий рецепт",
+    )
+    score = models.FloatField(
+        verbose_name="Сходство",
+    )
+
+    objects = SimilarRecipeQuerySet.as_manager()
+
+    class Meta:
+
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=(
+                    "recipe",
+                    "similar",
+                ),
+                name="unique_similar_recipe",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=("recipe", "-score", "similar",),
+                name="similar_recipe_score_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.similar} похож на {self.recipe}"
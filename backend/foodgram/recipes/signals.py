@@ -0,0 +1,25 @@
+"""Модуль обработчиков сигналов для рецептов."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Recipe
+from recipes.tasks import sync_feed
+from users.models import Follow
+
+SEARCH_FIELDS = {"name", "text"}
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(instance, update_fields=None, **kwargs):
+    """Обновляет поисковый вектор рецепта после сохранения."""
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def schedule_feed_sync(instance, created=True, **kwargs):
+    """Обновляет ленту пользователя после подписки или отписки."""
+    if created:
+        sync_feed.delay(instance.user_id, [instance.following_id])
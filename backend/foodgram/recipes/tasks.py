@@ -0,0 +1,64 @@
+"""Модуль фоновых задач приложения рецептов."""
+from django.db import transaction
+
+from recipes.constants import BATCH_SIZE, FEED_BACKFILL_SIZE
+from recipes.models import (
+    FeedEntry, Recipe, ShoppingCart, ShoppingListItem,)
+from tasks.registry import task
+from users.models import Follow
+
+
+@task
+def refresh_shopping_lists(recipe_id, user_ids, ingredient_ids=None):
+    """Пересчитывает списки покупок после изменения состава рецепта.
+
+    Кроме текущих владельцев корзин учитываются пользователи, у которых
+    рецепт был в корзине на момент изменения: они могли успеть убрать
+    его до выполнения задачи. Без списка ингредиентов списки этих
+    пользователей пересчитываются целиком.
+    """
+    users = set(user_ids)
+    users.update(
+        ShoppingCart.objects.filter(recipe_id=recipe_id)
+        .values_list("user", flat=True)
+    )
+    with transaction.atomic():
+        ShoppingListItem.objects.refresh(
+            users=users, ingredients=ingredient_ids,
+        )
+
+
+@task
+def fan_out_recipe(recipe_id):
+    """Добавляет новый рецепт в ленты подписчиков автора.
+
+    Рецепты авторов с очень большим числом подписчиков не раскладываются:
+    лента подмешивает их при чтении.
+    """
+    recipe = (
+        Recipe.objects.filter(pk=recipe_id)
+        .only("author_id", "pub_date")
+        .first()
+    )
+    if recipe is None or not FeedEntry.objects.is_fanned_out(
+        recipe.author_id,
+    ):
+        return
+    FeedEntry.objects.fan_out(recipe, BATCH_SIZE)
+
+
+@task
+def sync_feed(user_id, author_ids):
+    """Приводит ленту пользователя в соответствие с его подписками."""
+    followed = set(
+        Follow.objects.filter(user_id=user_id, following_id__in=author_ids)
+        .values_list("following_id", flat=True)
+    )
+    FeedEntry.objects.filter(user_id=user_id, author_id__in=(
+        set(author_ids) - followed
+    )).delete()
+    for author_id in followed:
+        if FeedEntry.objects.is_fanned_out(author_id):
+            FeedEntry.objects.backfill(
+                user_id, author_id, FEED_BACKFILL_SIZE,
+            )
@@ -0,0 +1,46 @@
+from io import StringIO
+
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
+
+from recipes.management.commands.benchmark_api import (
+    BENCHMARK_CACHES, DATASETS, Command, get_time_scale,)
+from recipes.models import Ingredient
+
+
+@override_settings(CACHES=BENCHMARK_CACHES)
+class BenchmarkBudgetTests(TransactionTestCase):
+    """Ключевые эндпоинты укладываются в бюджеты на малом наборе данных.
+
+    Время зависит от машины, поэтому его бюджеты умножаются
+    на BENCHMARK_TIME_SCALE.
+    """
+
+    def setUp(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name="Сахар %d" % number, measurement_unit="г")
+            for number in range(50)
+        )
+        self.command = Command(stdout=StringIO())
+        self.budgets = self.command._load_budgets(
+            settings.BASE_DIR / "benchmark_budgets.json",
+        )
+
+    def test_small_dataset_fits_budgets(self):
+        self.assertIn("small", self.budgets)
+        self.command._grow_dataset(DATASETS["small"], workers=1)
+        report = {"sizes": {"small": self.command._run_scenarios(repeat=3)}}
+        budgets = {"small": self.budgets["small"]}
+
+        self.assertEqual(
+            set(report["sizes"]["small"]["endpoints"]),
+            set(budgets["small"]),
+        )
+        for budget in budgets["small"].values():
+            self.assertEqual(
+                set(budget), {"queries", "wall_ms", "sql_ms"},
+            )
+        self.assertEqual(
+            self.command._check_budgets(report, budgets, get_time_scale()),
+            [],
+        )
@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import Count, F, Sum
+from django.test import TransactionTestCase
+
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingListItem,)
+from users.models import User
+
+
+class GenerateFixturesTests(TransactionTestCase):
+    """Генерация данных в малом объеме.
+
+    Пачки пишут дочерние процессы через свои соединения, поэтому тест
+    работает без обертки в транзакцию.
+    """
+
+    def setUp(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name="Ингредиент %d" % number, measurement_unit="г")
+            for number in range(20)
+        )
+
+    def generate(self, **options):
+        options = {
+            "users": 20, "recipes": 60, "favorites": 80, "carts": 30,
+            "follows": 80, "workers": 1, "chunk_size": 25, "seed": 1,
+            **options,
+        }
+        call_command("generate_fixtures", stdout=StringIO(), **options)
+
+    def test_creates_requested_users_and_recipes(self):
+        self.generate()
+
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Recipe.objects.count(), 60)
+        self.assertFalse(
+            Recipe.objects.annotate(count=Count("recipe_ingredients"))
+            .filter(count=0)
+            .exists()
+        )
+        self.assertFalse(Recipe.objects.filter(tags__isnull=True).exists())
+
+    def test_fills_columns_written_by_application_code(self):
+        self.generate()
+
+        recipes = Recipe.objects.all()
+        self.assertFalse(recipes.filter(short_link="").exists())
+        self.assertFalse(recipes.filter(search_vector__isnull=True).exists())
+        self.assertEqual(
+            recipes.filter(ingredients_updated_at=F("pub_date")).count(), 60,
+        )
+        self.assertEqual(
+            recipes.filter(similar_updated_at__isnull=True).count(), 60,
+        )
+
+    def test_builds_shopping_lists_from_carts(self):
+        self.generate()
+
+        totals = (
+            RecipeIngredient.objects.filter(
+                recipe__shoppingcarts__isnull=False,
+            )
+            .values_list("recipe__shoppingcarts__user", "ingredient")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+        items = ShoppingListItem.objects.values_list(
+            "user", "ingredient", "total_amount",
+        )
+        self.assertTrue(totals)
+        self.assertEqual(set(items), set(totals))
+
+    def test_appends_to_existing_data(self):
+        self.generate()
+        self.generate(users=10, recipes=30)
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Recipe.objects.count(), 90)
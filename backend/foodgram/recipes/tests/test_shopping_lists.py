@@ -0,0 +1,155 @@
+from django.db.models import Sum
+from django.test import TestCase
+from django.urls import reverse
+
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCart, ShoppingListItem,)
+from recipes.tasks import refresh_shopping_lists
+from tasks.models import Task
+from tasks.registry import get_task
+from users.models import User
+
+
+class ShoppingListTotalsTests(TestCase):
+    """Суммы списков покупок совпадают с корзинами после изменений.
+
+    Изменения выполняются в обход API: каскадным удалением и через
+    админку.
+    """
+
+    def setUp(self):
+        self.author = self.create_user("author")
+        self.buyer = self.create_user("buyer")
+        self.salt, self.sugar = Ingredient.objects.bulk_create([
+            Ingredient(name="Соль", measurement_unit="г"),
+            Ingredient(name="Сахар", measurement_unit="г"),
+        ])
+        self.soup = self.create_recipe(
+            self.author, {self.salt: 10, self.sugar: 20},
+        )
+        self.cake = self.create_recipe(self.buyer, {self.sugar: 100})
+        ShoppingCart.objects.create(user=self.buyer, recipe=self.soup)
+        ShoppingCart.objects.create(user=self.buyer, recipe=self.cake)
+
+    @staticmethod
+    def create_user(username):
+        return User.objects.create_user(
+            email="%s@example.com" % username,
+            username=username,
+            first_name=username,
+            last_name=username,
+            password="password",
+        )
+
+    @staticmethod
+    def create_recipe(author, amounts):
+        recipe = Recipe.objects.create(
+            author=author,
+            name="Рецепт %s" % author.username,
+            text="Описание",
+            image="recipes/images/recipe.png",
+            cooking_time=10,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient, amount=amount,
+            )
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    def run_refresh_tasks(self):
+        for task in Task.objects.filter(
+            name=refresh_shopping_lists.task_name,
+            status=Task.Status.PENDING,
+        ):
+            get_task(task.name)(*task.args, **task.kwargs)
+
+    def assertTotalsMatchCarts(self):
+        totals = (
+            RecipeIngredient.objects.filter(
+                recipe__shoppingcarts__isnull=False,
+            )
+            .values_list("recipe__shoppingcarts__user", "ingredient")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+        items = ShoppingListItem.objects.values_list(
+            "user", "ingredient", "total_amount",
+        )
+        self.assertEqual(set(items), set(totals))
+
+    def test_cart_changes_update_totals(self):
+        self.assertTotalsMatchCarts()
+        self.assertEqual(
+            ShoppingListItem.objects.get(ingredient=self.sugar).total_amount,
+            120,
+        )
+
+        ShoppingCart.objects.filter(recipe=self.cake).delete()
+        ShoppingCart.objects.filter(recipe=self.cake).delete()
+
+        self.assertTotalsMatchCarts()
+
+    def test_author_deletion_cascades_to_totals(self):
+        self.author.delete()
+
+        self.assertFalse(Recipe.objects.filter(pk=self.soup.pk).exists())
+        self.assertTotalsMatchCarts()
+        self.assertFalse(
+            ShoppingListItem.objects.filter(ingredient=self.salt).exists()
+        )
+
+    def test_admin_recipe_deletion_updates_totals(self):
+        self.client.force_login(self.create_superuser())
+
+        response = self.client.post(
+            reverse("admin:recipes_recipe_delete", args=(self.soup.pk,)),
+            {"post": "yes"},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTotalsMatchCarts()
+
+    def test_admin_ingredient_edit_refreshes_totals(self):
+        self.client.force_login(self.create_superuser())
+        sugar = RecipeIngredient.objects.get(
+            recipe=self.soup, ingredient=self.sugar,
+        )
+
+        response = self.client.post(
+            reverse(
+                "admin:recipes_recipeingredient_change", args=(sugar.pk,),
+            ),
+            {
+                "recipe": self.soup.pk,
+                "ingredient": self.sugar.pk,
+                "amount": 50,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.run_refresh_tasks()
+        self.assertTotalsMatchCarts()
+
+        response = self.client.post(
+            reverse(
+                "admin:recipes_recipeingredient_delete", args=(sugar.pk,),
+            ),
+            {"post": "yes"},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.run_refresh_tasks()
+        self.assertTotalsMatchCarts()
+        self.assertEqual(
+            ShoppingListItem.objects.get(ingredient=self.sugar).total_amount,
+            100,
+        )
+
+    def create_superuser(self):
+        return User.objects.create_superuser(
+            email="admin@example.com",
+            username="admin",
+            first_name="admin",
+            last_name="admin",
+            password="password",
+        )
@@ -0,0 +1,27 @@
+from django.contrib import admin
+
+from tasks.models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "id",
+        "name",
+        "status",
+        "attempts",
+        "run_at",
+        "created_at",
+    )
+    list_filter = ("status", "name",)
+    search_fields = ("name",)
+    readonly_fields = (
+        "name",
+        "args",
+        "kwargs",
+        "attempts",
+        "locked_at",
+        "last_error",
+        "created_at",
+    )
@@ -0,0 +1,12 @@
+"""Модуль с константами для фоновых задач."""
+MAX_TASK_NAME_LENGTH = 255  # Максимальная длина имени задачи.
+MAX_TASK_STATUS_LENGTH = 16  # Максимальная длина статуса задачи.
+
+TASK_MAX_ATTEMPTS = 5  # Количество попыток выполнения задачи.
+TASK_RETRY_DELAY = 10  # Базовая задержка перед повтором в секундах.
+TASK_MAX_RETRY_DELAY = 60 * 60  # Максимальная задержка перед повтором.
+TASK_POLL_INTERVAL = 5  # Ожидание новых задач в секундах.
+TASK_LOCK_TIMEOUT = 15 * 60  # Время, после которого задача считается зависшей.
+TASK_RETENTION = 7 * 24 * 60 * 60  # Время хранения выполненных задач.
+TASK_MAINTENANCE_INTERVAL = 60  # Период обслуживания очереди в секундах.
+TASK_NOTIFY_CHANNEL = "tasks"  # Канал LISTEN/NOTIFY для пробуждения worker.
@@ -0,0 +1,109 @@
+import logging
+import os
+import select
+import signal
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tasks.constants import (
+    TASK_LOCK_TIMEOUT, TASK_MAINTENANCE_INTERVAL,
+    TASK_NOTIFY_CHANNEL, TASK_POLL_INTERVAL, TASK_RETENTION,
+)
+from tasks.models import Task
+from tasks.registry import get_task
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Команда для запуска обработчика фоновых задач."""
+
+    help = "Выполняет фоновые задачи из очереди в базе данных"
+
+    def add_arguments(self, parser):
+        """Добавляет опции режима работы."""
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Завершиться, когда очередь опустеет",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=TASK_POLL_INTERVAL,
+            help="Максимальное ожидание новых задач в секундах",
+        )
+
+    def handle(self, *args, **options):
+        """Основная логика выполнения команды."""
+        self.stopping = False
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.listen()
+        logger.info("Task worker started")
+
+        next_maintenance = 0
+        while not self.stopping:
+            if time.monotonic() >= next_maintenance:
+                self.maintain()
+                next_maintenance = time.monotonic() + TASK_MAINTENANCE_INTERVAL
+
+            task = Task.objects.claim()
+            if task is not None:
+                self.run(task)
+            elif options["burst"]:
+                break
+            else:
+                self.wait(options["poll_interval"])
+
+        logger.info("Task worker stopped")
+
+    def stop(self, signum, frame):
+        """Завершает работу после текущей задачи."""
+        self.stopping = True
+        os.write(self.wakeup_write, b"\0")
+
+    def maintain(self):
+        """Возвращает зависшие задачи и чистит выполненные."""
+        requeued, failed = Task.objects.requeue_stale(TASK_LOCK_TIMEOUT)
+        if requeued:
+            logger.warning("Requeued %d stale tasks", requeued)
+        if failed:
+            logger.error("Failed %d stale tasks out of attempts", failed)
+        Task.objects.purge_finished(TASK_RETENTION)
+
+    def listen(self):
+        """Подписывает соединение на уведомления о новых задачах."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {TASK_NOTIFY_CHANNEL}")
+        self.listening = connection.connection
+
+    def wait(self, timeout):
+        """Ждет уведомления о новой задаче или истечения таймаута."""
+        if connection.connection is not self.listening:
+            self.listen()
+        select.select([self.listening, self.wakeup_read], [], [], timeout)
+        self.listening.poll()
+        self.listening.notifies.clear()
+
+    def run(self, task):
+        """Выполняет задачу и фиксирует результат."""
+        started = time.monotonic()
+        try:
+            get_task(task.name)(*task.args, **task.kwargs)
+        except Exception:
+            task.mark_failed(traceback.format_exc())
+            logger.exception(
+                "Task %s failed on attempt %d", task, task.attempts,
+            )
+            return
+
+        task.mark_done()
+        logger.info(
+            "Task %s done in %.3fs", task, time.monotonic() - started,
+        )
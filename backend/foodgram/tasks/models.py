@@ -0,0 +1,157 @@
+"""Модуль с моделями фоновых задач."""
+import random
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from tasks.constants import (
+    MAX_TASK_NAME_LENGTH, MAX_TASK_STATUS_LENGTH,
+    TASK_MAX_ATTEMPTS, TASK_MAX_RETRY_DELAY, TASK_RETRY_DELAY,
+)
+
+
+class TaskQuerySet(models.QuerySet):
+    """Запросы очереди фоновых задач."""
+
+    def claim(self):
+        """Забирает ближайшую готовую задачу, пропуская занятые."""
+        with transaction.atomic():
+            task = (
+                self.select_for_update(skip_locked=True)
+                .filter(status=Task.Status.PENDING, run_at__lte=timezone.now())
+                .order_by("run_at", "id")
+                .first()
+            )
+            if task is None:
+                return None
+
+            task.status = Task.Status.RUNNING
+            task.attempts += 1
+            task.locked_at = timezone.now()
+            task.save(update_fields=("status", "attempts", "locked_at"))
+        return task
+
+    def requeue_stale(self, timeout):
+        """Возвращает в очередь задачи, зависшие в обработке.
+
+        Задача, исчерпавшая попытки, завершается с ошибкой: иначе задача,
+        роняющая обработчик, повторялась бы бесконечно.
+        """
+        stale = self.filter(
+            status=Task.Status.RUNNING,
+            locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+        )
+        failed = stale.filter(attempts__gte=F("max_attempts")).update(
+            status=Task.Status.FAILED,
+            locked_at=None,
+            last_error="Task lock timed out after %d seconds" % timeout,
+        )
+        requeued = stale.update(status=Task.Status.PENDING, locked_at=None)
+        return requeued, failed
+
+    def purge_finished(self, retention):
+        """Удаляет выполненные задачи старше срока хранения."""
+        return self.filter(
+            status=Task.Status.DONE,
+            run_at__lt=timezone.now() - timedelta(seconds=retention),
+        ).delete()[0]
+
+
+class Task(models.Model):
+    """Фоновая задача."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Выполнена"
+        FAILED = "failed", "Ошибка"
+
+    name = models.CharField(
+        verbose_name="Имя задачи",
+        max_length=MAX_TASK_NAME_LENGTH,
+    )
+    args = models.JSONField(
+        verbose_name="Позиционные аргументы",
+        default=list,
+    )
+    kwargs = models.JSONField(
+        verbose_name="Именованные аргументы",
+        default=dict,
+    )
+    status = models.CharField(
+        verbose_name="Статус",
+        max_length=MAX_TASK_STATUS_LENGTH,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name="Попыток",
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name="Максимум попыток",
+        default=TASK_MAX_ATTEMPTS,
+    )
+    run_at = models.DateTimeField(
+        verbose_name="Время запуска",
+        default=timezone.now,
+    )
+    locked_at = models.DateTimeField(
+        verbose_name="Взята в работу",
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(
+        verbose_name="Последняя ошибка",
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name="Дата создания",
+        auto_now_add=True,
+    )
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+
+        ordering = ("run_at", "id",)
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+        indexes = [
+            models.Index(
+                fields=("run_at", "id",),
+                condition=Q(status="pending"),
+                name="task_pending_run_at_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    def mark_done(self):
+        """Отмечает задачу выполненной."""
+        self.status = self.Status.DONE
+        self.locked_at = None
+        self.last_error = ""
+        self.save(update_fields=("status", "locked_at", "last_error"))
+
+    def mark_failed(self, error):
+        """Планирует повтор с экспоненциальной задержкой или завершает."""
+        self.locked_at = None
+        self.last_error = error
+        if self.attempts >= self.max_attempts:
+            self.status = self.Status.FAILED
+        else:
+            delay = min(
+                TASK_RETRY_DELAY * 2 ** (self.attempts - 1),
+                TASK_MAX_RETRY_DELAY,
+            )
+            self.status = self.Status.PENDING
+            self.run_at = timezone.now() + timedelta(
+                seconds=random.uniform(delay / 2, delay),
+            )
+        self.save(
+            update_fields=("status", "run_at", "locked_at", "last_error"),
+        )
@@ -0,0 +1,59 @@
+"""Модуль регистрации и постановки фоновых задач в очередь."""
+import functools
+import logging
+
+from django.db import connection, transaction
+
+from tasks.constants import TASK_MAX_ATTEMPTS, TASK_NOTIFY_CHANNEL
+from tasks.models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def task(func=None, *, max_attempts=TASK_MAX_ATTEMPTS):
+    """Регистрирует функцию как фоновую задачу.
+
+    Аргументы задачи сохраняются в JSON, поэтому передавать нужно
+    идентификаторы, а не объекты. Задача может выполниться повторно,
+    так что она должна быть идемпотентной.
+    """
+    if func is None:
+        return functools.partial(task, max_attempts=max_attempts)
+
+    func.task_name = f"{func.__module__}.{func.__name__}"
+    func.max_attempts = max_attempts
+    func.delay = functools.partial(enqueue, func)
+    registry[func.task_name] = func
+    return func
+
+
+def enqueue(func, *args, **kwargs):
+    """Ставит задачу в очередь в текущей транзакции.
+
+    Строка задачи становится видна worker только после коммита и
+    откатывается вместе с транзакцией; после коммита worker будится
+    через NOTIFY.
+    """
+    queued = Task.objects.create(
+        name=func.task_name,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=func.max_attempts,
+    )
+    transaction.on_commit(notify_workers)
+
+    logger.debug("Task %s enqueued", queued)
+    return queued
+
+
+def notify_workers():
+    """Будит ожидающие обработчики задач."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", (TASK_NOTIFY_CHANNEL,))
+
+
+def get_task(name):
+    """Возвращает зарегистрированную функцию задачи по имени."""
+    return registry[name]
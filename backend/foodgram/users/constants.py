@@ -11,3 +11,6 @@ NOT_ALLOWED_USERNAME = [
     "me",
     "я",
 ]  # Черный список никнеймов.
+
+TOKEN_CACHE_SIZE = 10000  # Токенов в кэше аутентификации процесса.
+TOKEN_CACHE_TTL = 300  # Время жизни записи кэша токенов в секундах.
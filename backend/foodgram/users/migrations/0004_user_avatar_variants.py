@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_date_joined_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(default=dict, editable=False, verbose_name='Уменьшенные копии аватарки'),
+        ),
+    ]
@@ -52,6 +52,11 @@ class User(AbstractUser):
         null=True,
         default=None,
     )
+    avatar_variants = models.JSONField(
+        verbose_name="Уменьшенные копии аватарки",
+        default=dict,
+        editable=False,
+    )
     groups = models.ManyToManyField(
         to="auth.Group",
         related_name="custom_user_groups",
@@ -67,6 +72,12 @@ class User(AbstractUser):
         ordering = ("date_joined",)
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+        indexes = [
+            models.Index(
+                fields=("date_joined", "id",),
+                name="user_date_joined_id_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.username